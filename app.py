@@ -5,11 +5,13 @@ Streamlitを使用したインタラクティブな時間割生成アプリ
 """
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-from typing import Dict, List, Optional
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 from models import (
-    Teacher, Room, Class, Lesson, TimeSlot, Timetable,
-    Weekday, RoomType
+    Teacher, Room, Class, Lesson, TimeSlot, Assignment, Timetable,
+    RoomType
 )
 from backtrack_solver import BacktrackSolver
 from constraints import is_valid_assignment, validate_input_data
@@ -18,6 +20,11 @@ try:
     ORTOOLS_AVAILABLE = True
 except ImportError:
     ORTOOLS_AVAILABLE = False
+try:
+    import xlsxwriter
+    XLSXWRITER_AVAILABLE = True
+except ImportError:
+    XLSXWRITER_AVAILABLE = False
 
 
 # ページ設定
@@ -29,6 +36,42 @@ st.set_page_config(
 )
 
 
+# CSVの教室タイプ文字列 → RoomType
+ROOM_TYPE_MAP = {
+    'general': RoomType.GENERAL,
+    'science': RoomType.SCIENCE,
+    'gym': RoomType.GYM,
+    'music': RoomType.MUSIC,
+    'art': RoomType.ART,
+    'computer': RoomType.COMPUTER,
+    'home_ec': RoomType.HOME_EC,
+}
+
+
+def parse_room_types(column: pd.Series) -> List[RoomType]:
+    """教室タイプの列をRoomTypeのリストに変換（未知のタイプは普通教室）"""
+    room_types = column.astype(str).str.lower().map(ROOM_TYPE_MAP)
+    return [RoomType.GENERAL if pd.isna(t) else t for t in room_types.tolist()]
+
+
+def parse_availability_matrix(matrix_str: str) -> List[List[bool]]:
+    """
+    "1,1,1,1,1,1;1,1,1,1,1,1;..." 形式の担当可能時間マトリクスを解析
+    
+    曜日ごとの値を一つの配列にまとめてnumpyで一括変換する。
+    数値でない値や、6時限分ちょうどでない曜日がある場合はValueErrorを送出
+    """
+    day_values = [day_str.split(',') for day_str in matrix_str.split(';')]
+    # 個数の違う曜日があると、まとめた配列の値が隣の曜日にずれるため先に確認する
+    for day_index, values_of_day in enumerate(day_values):
+        if len(values_of_day) != 6:
+            raise ValueError(
+                f"{day_index + 1}日目の値が{len(values_of_day)}個です（6個必要）"
+            )
+    values = np.array([x for values_of_day in day_values for x in values_of_day], dtype=np.int64)
+    return values.reshape(len(day_values), 6).astype(bool).tolist()
+
+
 def parse_csv_teachers(df: pd.DataFrame) -> List[Teacher]:
     """
     CSVから教員データを読み込み
@@ -36,20 +79,23 @@ def parse_csv_teachers(df: pd.DataFrame) -> List[Teacher]:
     期待されるカラム: teacher_id, teacher_name, availability_matrix (オプション)
     """
     teachers = []
-    for _, row in df.iterrows():
-        teacher_id = str(row['teacher_id'])
-        teacher_name = str(row['teacher_name'])
-        
+    # 担当可能時間マトリクスの列はオプション
+    if 'availability_matrix' in df.columns:
+        matrix_values = df['availability_matrix'].tolist()
+    else:
+        matrix_values = [None] * len(df)
+    
+    for teacher_id, teacher_name, matrix_value in zip(
+        df['teacher_id'].astype(str).tolist(),
+        df['teacher_name'].astype(str).tolist(),
+        matrix_values
+    ):
         # 担当可能時間マトリクスがあれば読み込み（なければ全時間可）
-        if 'availability_matrix' in row and pd.notna(row['availability_matrix']):
+        if pd.notna(matrix_value):
             # "1,1,1,1,1,1;1,1,1,1,1,1;..." のような形式を期待
             try:
-                matrix_str = str(row['availability_matrix'])
-                matrix = []
-                for day_str in matrix_str.split(';'):
-                    day_values = [bool(int(x)) for x in day_str.split(',')]
-                    matrix.append(day_values)
-                teacher = Teacher(id=teacher_id, name=teacher_name, availability=matrix)
+                matrix = parse_availability_matrix(str(matrix_value))
+                teacher = Teacher.from_availability_matrix(teacher_id, teacher_name, matrix)
             except:
                 teacher = Teacher.create_with_full_availability(teacher_id, teacher_name)
         else:
@@ -67,24 +113,12 @@ def parse_csv_rooms(df: pd.DataFrame) -> List[Room]:
     期待されるカラム: room_id, room_name, room_type, capacity
     """
     rooms = []
-    for _, row in df.iterrows():
-        room_id = str(row['room_id'])
-        room_name = str(row['room_name'])
-        room_type_str = str(row['room_type']).lower()
-        capacity = int(row['capacity'])
-        
-        # RoomTypeにマッピング
-        room_type_map = {
-            'general': RoomType.GENERAL,
-            'science': RoomType.SCIENCE,
-            'gym': RoomType.GYM,
-            'music': RoomType.MUSIC,
-            'art': RoomType.ART,
-            'computer': RoomType.COMPUTER,
-            'home_ec': RoomType.HOME_EC,
-        }
-        
-        room_type = room_type_map.get(room_type_str, RoomType.GENERAL)
+    for room_id, room_name, room_type, capacity in zip(
+        df['room_id'].astype(str).tolist(),
+        df['room_name'].astype(str).tolist(),
+        parse_room_types(df['room_type']),
+        df['capacity'].astype(int).tolist()
+    ):
         room = Room(id=room_id, name=room_name, room_type=room_type, capacity=capacity)
         rooms.append(room)
     
@@ -98,11 +132,11 @@ def parse_csv_classes(df: pd.DataFrame) -> List[Class]:
     期待されるカラム: class_id, class_name, size
     """
     classes = []
-    for _, row in df.iterrows():
-        class_id = str(row['class_id'])
-        class_name = str(row['class_name'])
-        size = int(row['size'])
-        
+    for class_id, class_name, size in zip(
+        df['class_id'].astype(str).tolist(),
+        df['class_name'].astype(str).tolist(),
+        df['size'].astype(int).tolist()
+    ):
         cls = Class(id=class_id, name=class_name, size=size)
         classes.append(cls)
     
@@ -116,31 +150,29 @@ def parse_csv_lessons(df: pd.DataFrame) -> List[Lesson]:
     期待されるカラム: lesson_id, subject, units, teacher_ids, class_ids, room_type, synchronization_id (オプション)
     """
     lessons = []
-    for _, row in df.iterrows():
-        lesson_id = str(row['lesson_id'])
-        subject = str(row['subject'])
-        units = int(row['units'])
-        
-        # カンマ区切りのIDリストを解析
-        teacher_ids = [t.strip() for t in str(row['teacher_ids']).split(',')]
-        class_ids = [c.strip() for c in str(row['class_ids']).split(',')]
-        
-        room_type_str = str(row['room_type']).lower()
-        room_type_map = {
-            'general': RoomType.GENERAL,
-            'science': RoomType.SCIENCE,
-            'gym': RoomType.GYM,
-            'music': RoomType.MUSIC,
-            'art': RoomType.ART,
-            'computer': RoomType.COMPUTER,
-            'home_ec': RoomType.HOME_EC,
-        }
-        room_type = room_type_map.get(room_type_str, RoomType.GENERAL)
+    # 同期IDの列はオプション
+    if 'synchronization_id' in df.columns:
+        sync_values = df['synchronization_id'].tolist()
+    else:
+        sync_values = [None] * len(df)
+    
+    for lesson_id, subject, units, teacher_id_lists, class_id_lists, room_type, sync_value in zip(
+        df['lesson_id'].astype(str).tolist(),
+        df['subject'].astype(str).tolist(),
+        df['units'].astype(int).tolist(),
+        # カンマ区切りのIDリストを列ごとに分割
+        df['teacher_ids'].astype(str).str.split(',').tolist(),
+        df['class_ids'].astype(str).str.split(',').tolist(),
+        parse_room_types(df['room_type']),
+        sync_values
+    ):
+        teacher_ids = [t.strip() for t in teacher_id_lists]
+        class_ids = [c.strip() for c in class_id_lists]
         
         # 同期IDはオプション
         sync_id = None
-        if 'synchronization_id' in row and pd.notna(row['synchronization_id']):
-            sync_id = str(row['synchronization_id'])
+        if pd.notna(sync_value):
+            sync_id = str(sync_value)
         
         lesson = Lesson(
             id=lesson_id,
@@ -156,118 +188,236 @@ def parse_csv_lessons(df: pd.DataFrame) -> List[Lesson]:
     return lessons
 
 
+# CSVごとの列の型（IDや名前は文字列のまま読み込み、型推論を省く）
+TEACHERS_CSV_DTYPES = {
+    'teacher_id': 'string',
+    'teacher_name': 'string',
+    'availability_matrix': 'string',
+}
+ROOMS_CSV_DTYPES = {
+    'room_id': 'string',
+    'room_name': 'string',
+    'room_type': 'string',
+    'capacity': 'int64',
+}
+CLASSES_CSV_DTYPES = {
+    'class_id': 'string',
+    'class_name': 'string',
+    'size': 'int64',
+}
+LESSONS_CSV_DTYPES = {
+    'lesson_id': 'string',
+    'subject': 'string',
+    'units': 'int64',
+    'teacher_ids': 'string',
+    'class_ids': 'string',
+    'room_type': 'string',
+    'synchronization_id': 'string',
+}
+
+
+def read_csv_bytes(data: bytes, dtype: Dict[str, str]) -> pd.DataFrame:
+    """CSVを読み込む（pyarrowがインストールされていればpyarrowエンジンを使用）"""
+    try:
+        return pd.read_csv(io.BytesIO(data), engine='pyarrow', dtype=dtype)
+    except ImportError:
+        return pd.read_csv(io.BytesIO(data), dtype=dtype)
+
+
+@st.cache_data(show_spinner=False)
+def load_input_csv(
+    teachers_csv: bytes,
+    rooms_csv: bytes,
+    classes_csv: bytes,
+    lessons_csv: bytes
+) -> Tuple[List[Teacher], List[Room], List[Class], List[Lesson]]:
+    """
+    アップロードされたCSVを読み込んで各エンティティに変換
+    
+    ファイル内容(bytes)をキーにキャッシュするため、同じファイルのままの再実行では再解析しない
+    """
+    teachers = parse_csv_teachers(read_csv_bytes(teachers_csv, TEACHERS_CSV_DTYPES))
+    rooms = parse_csv_rooms(read_csv_bytes(rooms_csv, ROOMS_CSV_DTYPES))
+    classes = parse_csv_classes(read_csv_bytes(classes_csv, CLASSES_CSV_DTYPES))
+    lessons = parse_csv_lessons(read_csv_bytes(lessons_csv, LESSONS_CSV_DTYPES))
+    return teachers, rooms, classes, lessons
+
+
+def _timetable_cache_key(timetable: Timetable) -> Tuple:
+    """
+    キャッシュ用に時間割の内容をタプルで表す
+    
+    表示には科目名・教室名なども使うため、IDだけでなくLesson・Roomそのものをキーに含める
+    （IDを変えずにCSVの科目名などを直したときに古い表示を返さないため）
+    """
+    return tuple(
+        (a.lesson, a.timeslot.index, a.room, a.teacher_id)
+        for a in timetable.assignments
+    )
+
+
+# 曜日の表示名（Weekday.valueの順）
+WEEKDAY_LABELS = ["月", "火", "水", "木", "金"]
+PERIOD_LABELS = [f"{p}限" for p in range(1, 7)]
+
+
+@st.cache_data(show_spinner=False, hash_funcs={Timetable: _timetable_cache_key})
 def timetable_to_dataframe(timetable: Timetable) -> pd.DataFrame:
     """時間割をpandas DataFrameに変換"""
-    weekday_names = {
-        Weekday.MONDAY: "月",
-        Weekday.TUESDAY: "火",
-        Weekday.WEDNESDAY: "水",
-        Weekday.THURSDAY: "木",
-        Weekday.FRIDAY: "金"
-    }
-    
-    data = []
+    # 列ごとのリストを一度の走査で作成
+    weekdays = []
+    periods = []
+    subjects = []
+    class_names = []
+    room_names = []
+    teacher_ids = []
+    sync_ids = []
     for assignment in timetable.assignments:
-        data.append({
-            "曜日": weekday_names[assignment.timeslot.weekday],
-            "時限": assignment.timeslot.period,
-            "科目": assignment.lesson.subject,
-            "クラス": ", ".join(assignment.lesson.class_ids),
-            "教室": assignment.room.name,
-            "教員ID": assignment.teacher_id,
-            "同期ID": assignment.lesson.synchronization_id or ""
-        })
-    
-    df = pd.DataFrame(data)
+        lesson = assignment.lesson
+        weekdays.append(WEEKDAY_LABELS[assignment.timeslot.weekday.value])
+        periods.append(assignment.timeslot.period)
+        subjects.append(lesson.subject)
+        class_names.append(", ".join(lesson.class_ids))
+        room_names.append(assignment.room.name)
+        teacher_ids.append(assignment.teacher_id)
+        sync_ids.append(lesson.synchronization_id or "")
+    
+    df = pd.DataFrame({
+        "曜日": pd.Categorical(weekdays, categories=WEEKDAY_LABELS, ordered=True),
+        "時限": pd.Series(periods, dtype="int64"),
+        "科目": subjects,
+        "クラス": class_names,
+        "教室": room_names,
+        "教員ID": teacher_ids,
+        "同期ID": sync_ids
+    })
     # 曜日と時限でソート
-    weekday_order = ["月", "火", "水", "木", "金"]
-    df["曜日"] = pd.Categorical(df["曜日"], categories=weekday_order, ordered=True)
     df = df.sort_values(["曜日", "時限"]).reset_index(drop=True)
     
     return df
 
 
+def _timetable_grid(cells: List[Tuple[TimeSlot, str]]) -> pd.DataFrame:
+    """(時間枠, セル文字列) のリストから6時限×5曜日の表を作成"""
+    grid = np.full((len(PERIOD_LABELS), len(WEEKDAY_LABELS)), "", dtype=object)
+    for timeslot, cell_text in cells:
+        grid[timeslot.period - 1, timeslot.weekday.value] = cell_text
+    return pd.DataFrame(grid, index=PERIOD_LABELS, columns=WEEKDAY_LABELS)
+
+
+def _class_cell_text(assignment: Assignment) -> str:
+    """クラス別時間割のセル文字列（科目と教室）"""
+    return f"{assignment.lesson.subject}\n({assignment.room.name})"
+
+
+def _teacher_cell_text(assignment: Assignment) -> str:
+    """教員別時間割のセル文字列（科目とクラス）"""
+    return f"{assignment.lesson.subject}\n({', '.join(assignment.lesson.class_ids)})"
+
+
+@st.cache_data(show_spinner=False, hash_funcs={Timetable: _timetable_cache_key})
 def create_class_timetable(timetable: Timetable, class_id: str) -> pd.DataFrame:
     """特定クラスの時間割を2次元表形式で作成"""
-    weekday_names = {
-        Weekday.MONDAY: "月",
-        Weekday.TUESDAY: "火",
-        Weekday.WEDNESDAY: "水",
-        Weekday.THURSDAY: "木",
-        Weekday.FRIDAY: "金"
-    }
-    
-    # 6時限×5曜日の空の表を作成
-    periods = list(range(1, 7))
-    weekdays = ["月", "火", "水", "木", "金"]
-    
-    data = {weekday: [""] * 6 for weekday in weekdays}
-    
-    # 時間割データを埋める
-    for assignment in timetable.assignments:
-        if class_id in assignment.lesson.class_ids:
-            weekday = weekday_names[assignment.timeslot.weekday]
-            period_idx = assignment.timeslot.period - 1
-            
-            cell_text = f"{assignment.lesson.subject}\n({assignment.room.name})"
-            data[weekday][period_idx] = cell_text
-    
-    df = pd.DataFrame(data, index=[f"{p}限" for p in periods])
-    
-    return df
+    return _timetable_grid([
+        (a.timeslot, _class_cell_text(a))
+        for a in timetable.assignments
+        if class_id in a.lesson.class_ids
+    ])
 
 
+@st.cache_data(show_spinner=False, hash_funcs={Timetable: _timetable_cache_key})
 def create_teacher_timetable(timetable: Timetable, teacher_id: str) -> pd.DataFrame:
     """特定教員の時間割を2次元表形式で作成"""
-    weekday_names = {
-        Weekday.MONDAY: "月",
-        Weekday.TUESDAY: "火",
-        Weekday.WEDNESDAY: "水",
-        Weekday.THURSDAY: "木",
-        Weekday.FRIDAY: "金"
-    }
-    
-    periods = list(range(1, 7))
-    weekdays = ["月", "火", "水", "木", "金"]
-    
-    data = {weekday: [""] * 6 for weekday in weekdays}
+    return _timetable_grid([
+        (a.timeslot, _teacher_cell_text(a))
+        for a in timetable.assignments
+        if a.teacher_id == teacher_id
+    ])
+
+
+@st.cache_data(show_spinner=False, hash_funcs={Timetable: _timetable_cache_key})
+def export_to_excel(timetable: Timetable, classes: List[Class], teachers: Dict[str, Teacher]) -> bytes:
+    """時間割をExcelファイルとしてエクスポート"""
+    output = io.BytesIO()
     
+    # クラス別・教員別のセルを一度の走査でまとめて振り分け
+    class_cells: Dict[str, List[Tuple[TimeSlot, str]]] = defaultdict(list)
+    teacher_cells: Dict[str, List[Tuple[TimeSlot, str]]] = defaultdict(list)
     for assignment in timetable.assignments:
-        if assignment.teacher_id == teacher_id:
-            weekday = weekday_names[assignment.timeslot.weekday]
-            period_idx = assignment.timeslot.period - 1
-            
-            cell_text = f"{assignment.lesson.subject}\n({', '.join(assignment.lesson.class_ids)})"
-            data[weekday][period_idx] = cell_text
+        class_text = _class_cell_text(assignment)
+        for class_id in assignment.lesson.class_ids:
+            class_cells[class_id].append((assignment.timeslot, class_text))
+        teacher_cells[assignment.teacher_id].append((assignment.timeslot, _teacher_cell_text(assignment)))
+    
+    # (シート名, 表, 行ラベルを出力するか)
+    sheets: List[Tuple[str, pd.DataFrame, bool]] = []
+    used_sheet_names: Set[str] = set()
+    
+    # 全体の時間割
+    sheets.append((_unique_sheet_name('全体', used_sheet_names), timetable_to_dataframe(timetable), False))
+    
+    # クラスごとの時間割
+    for cls in classes:
+        sheet_name = _unique_sheet_name(f'クラス_{cls.name}', used_sheet_names)
+        sheets.append((sheet_name, _timetable_grid(class_cells[cls.id]), True))
+    
+    # 教員ごとの時間割
+    for teacher_id, teacher in teachers.items():
+        sheet_name = _unique_sheet_name(f'教員_{teacher.name[:20]}', used_sheet_names)
+        sheets.append((sheet_name, _timetable_grid(teacher_cells[teacher_id]), True))
+    
+    if XLSXWRITER_AVAILABLE:
+        _write_sheets_xlsxwriter(output, sheets)
+    else:
+        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+            for sheet_name, df, index in sheets:
+                df.to_excel(writer, sheet_name=sheet_name, index=index)
     
-    df = pd.DataFrame(data, index=[f"{p}限" for p in periods])
+    output.seek(0)
+    return output.getvalue()
+
+
+def _unique_sheet_name(name: str, used: Set[str]) -> str:
+    """
+    Excelのシート名を31文字以内で一意にする
     
-    return df
+    同名のクラスや教員（先頭20文字が同じ名前を含む）がいると重複するため、
+    大文字小文字を区別せずに既出の名前と比べ、重複していれば _2, _3 ... を付ける
+    """
+    sheet_name = name[:31]
+    suffix_no = 2
+    while sheet_name.lower() in used:
+        suffix = f"_{suffix_no}"
+        sheet_name = name[:31 - len(suffix)] + suffix
+        suffix_no += 1
+    used.add(sheet_name.lower())
+    return sheet_name
 
 
-def export_to_excel(timetable: Timetable, classes: List[Class], teachers: Dict[str, Teacher]) -> bytes:
-    """時間割をExcelファイルとしてエクスポート"""
-    output = io.BytesIO()
+def _write_sheets_xlsxwriter(output: io.BytesIO, sheets: List[Tuple[str, pd.DataFrame, bool]]):
+    """
+    xlsxwriterのconstant_memoryモードで各シートを書き出す
     
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # 全体の時間割
-        df_all = timetable_to_dataframe(timetable)
-        df_all.to_excel(writer, sheet_name='全体', index=False)
+    constant_memoryモードは行単位で書き出すため、前の行には戻れない。
+    DataFrame.to_excelは列ごとにセルを書くので使わず、見出し行から順に1行ずつ書く
+    """
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'in_memory': True})
+    # pandasのto_excelと同じ見出しの書式
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    
+    for sheet_name, df, index in sheets:
+        worksheet = workbook.add_worksheet(sheet_name)
+        offset = 1 if index else 0
         
-        # クラスごとの時間割
-        for cls in classes:
-            df_class = create_class_timetable(timetable, cls.id)
-            df_class.to_excel(writer, sheet_name=f'クラス_{cls.name}')
+        for col, column_name in enumerate(df.columns, start=offset):
+            worksheet.write(0, col, column_name, header_format)
         
-        # 教員ごとの時間割
-        for teacher_id, teacher in teachers.items():
-            df_teacher = create_teacher_timetable(timetable, teacher_id)
-            # シート名は31文字まで
-            sheet_name = f'教員_{teacher.name[:20]}'
-            df_teacher.to_excel(writer, sheet_name=sheet_name)
+        for row, (label, values) in enumerate(zip(df.index, df.itertuples(index=False, name=None)), start=1):
+            if index:
+                worksheet.write(row, 0, label, header_format)
+            worksheet.write_row(row, offset, values)
     
-    output.seek(0)
-    return output.getvalue()
+    workbook.close()
 
 
 def main():
@@ -292,6 +442,14 @@ def main():
             step=1000,
             help="バックトラック法の最大試行回数"
         )
+        seed = st.sidebar.number_input(
+            "乱数シード",
+            min_value=0,
+            value=0,
+            step=1,
+            key='backtrack_seed',
+            help="探索をやり直す際の順序を決める乱数シード（同じシードなら同じ結果になります）"
+        )
     else:
         timeout = st.sidebar.number_input(
             "タイムアウト (秒)",
@@ -338,17 +496,13 @@ def main():
     # データの読み込みと検証
     if teachers_file and rooms_file and classes_file and lessons_file:
         try:
-            # CSVの読み込み
-            df_teachers = pd.read_csv(teachers_file)
-            df_rooms = pd.read_csv(rooms_file)
-            df_classes = pd.read_csv(classes_file)
-            df_lessons = pd.read_csv(lessons_file)
-            
-            # データ変換
-            teachers = parse_csv_teachers(df_teachers)
-            rooms = parse_csv_rooms(df_rooms)
-            classes = parse_csv_classes(df_classes)
-            lessons = parse_csv_lessons(df_lessons)
+            # CSVの読み込みとデータ変換（ファイル内容が同じならキャッシュを使用）
+            teachers, rooms, classes, lessons = load_input_csv(
+                teachers_file.getvalue(),
+                rooms_file.getvalue(),
+                classes_file.getvalue(),
+                lessons_file.getvalue()
+            )
             
             # 入力データ検証
             is_valid, errors = validate_input_data(teachers, rooms, classes, lessons)
@@ -376,7 +530,7 @@ def main():
                             timetable = solver.solve(timeout_seconds=timeout)
                         else:
                             solver = BacktrackSolver(teachers, rooms, classes, lessons)
-                            timetable = solver.solve(max_attempts=max_attempts)
+                            timetable = solver.solve(max_attempts=max_attempts, seed=int(seed))
                         
                         elapsed_time = time.time() - start_time
                         
@@ -393,11 +547,19 @@ def main():
                             st.session_state['generation_time'] = elapsed_time
                             st.session_state['is_valid'] = is_valid_result
                             st.session_state['errors'] = constraint_errors
+                            # 再現用に使用した乱数シードを保持（OR-Toolsの場合はNone）
+                            st.session_state['seed'] = int(seed) if isinstance(solver, BacktrackSolver) else None
                             
                             st.rerun()
                         else:
                             st.error(f"❌ 時間割の生成に失敗しました ({elapsed_time:.2f}秒)")
                             st.warning("制約が厳しすぎる可能性があります。データを見直すか、最大試行回数を増やしてください。")
+                            if isinstance(solver, BacktrackSolver) and solver.best_partial is not None:
+                                total_units = sum(l.units for l in lessons)
+                                st.info(
+                                    f"最大 {len(solver.best_partial)}/{total_units} コマまで配置できました"
+                                    f"（再始動 {solver.restart_count}回、乱数シード {int(seed)}）"
+                                )
         
         except Exception as e:
             st.error(f"❌ エラーが発生しました: {str(e)}")
@@ -427,6 +589,9 @@ def main():
             else:
                 st.metric("制約チェック", "⚠️ 警告", delta=f"{len(constraint_errors)}件")
         
+        if st.session_state.get('seed') is not None:
+            st.caption(f"乱数シード: {st.session_state['seed']}（同じシードで同じ時間割を再現できます）")
+        
         if not is_valid_result:
             with st.expander("制約違反の詳細"):
                 for error in constraint_errors:
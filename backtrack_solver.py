@@ -3,23 +3,34 @@
 
 純粋Pythonでのバックトラック実装（OR-Toolsの代替/比較用）
 """
+import random
+from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Set, Tuple
 from models import (
     Teacher, Room, Class, Lesson, TimeSlot, Assignment, Timetable,
     Weekday, RoomType
 )
-from constraints import (
-    check_teacher_conflict,
-    check_room_conflict,
-    check_class_conflict,
-    check_room_type,
-    check_teacher_availability
-)
+
+
+@dataclass
+class _SearchFrame:
+    """探索スタックの1段（1タスクの配置）"""
+    task: int
+    slot_order: List[int]  # 時間枠を試す順序
+    slot_index: int  # 現在の時間枠
+    cands: int  # 現在の時間枠で未試行の候補ビット
+    equivalent_cands: List[int]  # 候補ごとの入れ替え可能な候補ビット
+    slot_pos: int = 0  # slot_order上の現在位置
+    mark: int = 0  # 現在の配置を行う前の枝刈り記録の長さ
+    conflict_set: Set[int] = field(default_factory=set)
 
 
 class BacktrackSolver:
     """再帰的バックトラックによる時間割生成"""
     
+    # 最初の探索の試行回数の区切り（再始動ごとに倍増）
+    RESTART_BASE_ATTEMPTS = 1000
+    
     def __init__(
         self,
         teachers: List[Teacher],
@@ -41,37 +52,123 @@ class BacktrackSolver:
                 if lesson.synchronization_id not in self.sync_groups:
                     self.sync_groups[lesson.synchronization_id] = []
                 self.sync_groups[lesson.synchronization_id].append(lesson)
+        
+        # 教員ごとの担当可能時間ビットマスク（bit i = self.timeslots[i] に担当可能）
+        self._teacher_mask: Dict[str, int] = {}
+        for teacher_id, teacher in self.teachers.items():
+            mask = 0
+            for slot_index, timeslot in enumerate(self.timeslots):
+                if teacher.is_available(timeslot):
+                    mask |= 1 << slot_index
+            self._teacher_mask[teacher_id] = mask
+        
+        # 教室タイプ別の教室リスト
+        self._rooms_by_type: Dict[RoomType, List[Room]] = {}
+        for room in self.rooms.values():
+            self._rooms_by_type.setdefault(room.room_type, []).append(room)
+        
+        # Lessonごとの (教室, 教員) 候補。Lessonは不変なので探索前に一度だけ構築する
+        self._candidates: Dict[str, List[Tuple[Room, str]]] = {
+            lesson.id: [
+                (room, teacher_id)
+                for room in self._rooms_by_type.get(lesson.room_type_required, [])
+                for teacher_id in lesson.teacher_ids
+            ]
+            for lesson in self.lessons
+        }
+        
+        # Lessonごとに、各教員・教室を使う候補のビットマスク（bit i = 候補i）
+        self._teacher_cand_masks: Dict[str, Dict[str, int]] = {}
+        self._room_cand_masks: Dict[str, Dict[str, int]] = {}
+        for lesson_id, candidates in self._candidates.items():
+            teacher_masks: Dict[str, int] = {}
+            room_masks: Dict[str, int] = {}
+            for cand_index, (room, teacher_id) in enumerate(candidates):
+                teacher_masks[teacher_id] = teacher_masks.get(teacher_id, 0) | (1 << cand_index)
+                room_masks[room.id] = room_masks.get(room.id, 0) | (1 << cand_index)
+            self._teacher_cand_masks[lesson_id] = teacher_masks
+            self._room_cand_masks[lesson_id] = room_masks
+        
+        # 値の対称性: 同じ教室タイプ・定員の教室同士、担当Lessonが同じ教員同士は
+        # 同一時間枠内で入れ替えても解の可否が変わらない。
+        # 候補ごとに、入れ替え可能な候補のビットマスク（自身を含む）を求めておく
+        teacher_lessons: Dict[str, Set[str]] = {}
+        for lesson in self.lessons:
+            for teacher_id in lesson.teacher_ids:
+                teacher_lessons.setdefault(teacher_id, set()).add(lesson.id)
+        self._equivalent_cands: Dict[str, List[int]] = {}
+        for lesson_id, candidates in self._candidates.items():
+            masks_by_key: Dict[Tuple, int] = {}
+            keys = []
+            for cand_index, (room, teacher_id) in enumerate(candidates):
+                key = (room.room_type, room.capacity, frozenset(teacher_lessons[teacher_id]))
+                masks_by_key[key] = masks_by_key.get(key, 0) | (1 << cand_index)
+                keys.append(key)
+            self._equivalent_cands[lesson_id] = [masks_by_key[key] for key in keys]
+        
+        # 探索状態（solveのたびに初期化）
+        self._tasks: List[Tuple[Lesson, int]] = []  # (lesson, unit_index)
+        self._domains: List[List[int]] = []  # task -> slot_index -> 残り候補のビットマスク
+        self._domain_sizes: List[int] = []
+        self._clashes: List[List[int]] = []  # 同一時間枠に置けないタスク（同一Lesson・クラス共有）
+        self._sync_partners: List[List[int]] = []  # 同一時間枠に置く必要があるタスク
+        self._slot_orders: List[List[int]] = []  # task -> 時間枠を試す順序
+        self._unassigned: Set[int] = set()
+        self._trail: List[Tuple[int, int, int]] = []  # 枝刈りの記録 (task, slot_index, 取り除いた候補ビット)
+        self._pruned_by: List[List[int]] = []  # task -> そのドメインを枝刈りした配置の深さ（昇順）
+        # 配置済みタスク（配置順の並列配列。Assignmentは解が見つかった時点で一度だけ生成する）
+        self._placed_tasks: List[int] = []
+        self._placed_slots: List[int] = []
+        self._placed_cands: List[int] = []
+        # これまでで最も多く配置できた途中状態 (Lesson, slot_index, cand_index)
+        self._best_placement: List[Tuple[Lesson, int, int]] = []
+        self.best_partial: Optional[Timetable] = None
+        self.restart_count = 0
     
-    def solve(self, max_attempts: int = 10000) -> Optional[Timetable]:
+    def solve(self, max_attempts: int = 10000, seed: int = 0, verbose: bool = True) -> Optional[Timetable]:
         """
         バックトラックで時間割を生成
         
+        最初は決定的な順序で探索し、試行回数の区切りに達したら
+        乱数で探索順序を変えて最初からやり直す（区切りは再始動ごとに倍増）。
+        悪い初期の枝で試行回数を使い切ることを避けるため。
+        
         Args:
-            max_attempts: 最大試行回数
+            max_attempts: 最大試行回数（全ての再始動の合計）
+            seed: 再始動時の乱数シード（同じシードなら同じ結果になる）
+            verbose: Falseなら解が見つからなかったときのメッセージを出さない
         
         Returns:
-            生成された時間割（解が見つからない場合はNone）
+            生成された時間割（解が見つからない場合はNone。
+            その場合は最も多く配置できた途中の時間割を best_partial に保持）
         """
-        # Lessonを配置の難しさでソート（MRVヒューリスティック）
-        sorted_lessons = self._sort_lessons_by_difficulty()
-        
-        # 各Lessonの配置タスクを作成（units分だけコピー）
-        tasks: List[Tuple[Lesson, int]] = []  # (lesson, unit_index)
-        for lesson in sorted_lessons:
-            for unit_index in range(lesson.units):
-                tasks.append((lesson, unit_index))
-        
-        timetable = Timetable()
         self.attempt_count = 0
-        self.max_attempts = max_attempts
+        self.restart_count = 0
+        self.best_partial = None
+        self._best_placement = []
         
-        if self._backtrack(tasks, 0, timetable):
-            return timetable
-        else:
+        cutoff = self.RESTART_BASE_ATTEMPTS
+        rng: Optional[random.Random] = None
+        while True:
+            self._init_search(rng)
+            self.max_attempts = min(max_attempts, self.attempt_count + cutoff)
+            if self._search():
+                return self._build_timetable()
+            
+            # 区切りに達する前に探索し尽くした場合は解なし。全体の上限に達した場合も終了
+            if self.attempt_count <= self.max_attempts or self.max_attempts >= max_attempts:
+                break
+            
+            self.restart_count += 1
+            cutoff *= 2
+            rng = random.Random(seed + self.restart_count)
+        
+        self.best_partial = self._build_timetable(self._best_placement)
+        if verbose:
             print(f"解が見つかりませんでした（{self.attempt_count}回試行）")
-            return None
+        return None
     
-    def _sort_lessons_by_difficulty(self) -> List[Lesson]:
+    def _sort_lessons_by_difficulty(self, rng: Optional[random.Random] = None) -> List[Lesson]:
         """
         Lessonを配置の難しさでソート（難しいものから優先）
         
@@ -80,6 +177,8 @@ class BacktrackSolver:
         2. 担当可能な教員が少ない
         3. 必要な教室タイプが少ない
         4. 週単位数が多い
+        
+        rngを指定した場合、同点のLessonの順序を乱数で決める
         """
         def difficulty_score(lesson: Lesson) -> Tuple:
             # 同期制約がある場合は優先度が高い
@@ -89,216 +188,281 @@ class BacktrackSolver:
             num_teachers = len(lesson.teacher_ids)
             
             # 適切な教室数（少ないほど難しい）
-            num_rooms = len([r for r in self.rooms.values() if r.room_type == lesson.room_type_required])
+            num_rooms = len(self._rooms_by_type.get(lesson.room_type_required, []))
             
             # 週単位数（多いほど難しい）
             units = lesson.units
             
             # タプルで返す（降順でソート）
+            if rng is not None:
+                return (-has_sync, num_teachers, num_rooms, -units, rng.random())
             return (-has_sync, num_teachers, num_rooms, -units)
         
         return sorted(self.lessons, key=difficulty_score)
     
-    def _backtrack(
-        self,
-        tasks: List[Tuple[Lesson, int]],
-        task_index: int,
-        timetable: Timetable
-    ) -> bool:
+    def _init_search(self, rng: Optional[random.Random] = None):
         """
-        再帰的バックトラック
+        配置タスクと各タスクの初期ドメインを構築
         
-        Args:
-            tasks: 配置すべきタスクのリスト
-            task_index: 現在のタスクインデックス
-            timetable: 現在の時間割
-        
-        Returns:
-            解が見つかったか
+        タスクは (Lesson, unit_index) で、同期グループ内の同じunit_indexのタスク同士は
+        同一時間枠に配置する制約で結ばれる
+        rngを指定した場合、同点のタスク選択順と各タスクの時間枠を試す順序を乱数で決める
         """
-        # 試行回数の上限チェック
-        self.attempt_count += 1
-        if self.attempt_count > self.max_attempts:
-            return False
-        
-        # 全てのタスクが配置された
-        if task_index >= len(tasks):
-            return True
-        
-        lesson, unit_index = tasks[task_index]
-        
-        # 同期制約がある場合の処理
-        if lesson.synchronization_id:
-            sync_lessons = self.sync_groups[lesson.synchronization_id]
-            # 同期グループの最初のLessonの場合のみ配置を試みる
-            if lesson == sync_lessons[0]:
-                return self._place_synchronized_lessons(sync_lessons, unit_index, tasks, task_index, timetable)
-            else:
-                # 他の同期Lessonは既に配置済みなのでスキップ
-                return self._backtrack(tasks, task_index + 1, timetable)
-        
-        # 通常のLesson配置
-        # 既に配置済みのtimeslotを取得
-        already_used_timeslots = {
-            a.timeslot for a in timetable.assignments
-            if a.lesson.id == lesson.id
-        }
+        # Lessonを配置の難しさでソート（同点時のタスク選択順に使用）
+        sorted_lessons = self._sort_lessons_by_difficulty(rng)
         
-        # 配置可能なtimeslotを試す
-        for timeslot in self.timeslots:
-            # 同じLessonは異なるtimeslotに配置
-            if timeslot in already_used_timeslots:
-                continue
-            
-            # 適切な教室と教員の組み合わせを試す
-            for room in self.rooms.values():
-                if room.room_type != lesson.room_type_required:
+        # 各Lessonの配置タスクを作成（units分だけコピー）
+        self._tasks = [
+            (lesson, unit_index)
+            for lesson in sorted_lessons
+            for unit_index in range(lesson.units)
+        ]
+        
+        # 初期ドメイン: 教員が担当可能な (timeslot, 教室, 教員) の組み合わせ
+        self._domains = []
+        self._domain_sizes = []
+        for lesson, _ in self._tasks:
+            domain = []
+            for slot_index in range(len(self.timeslots)):
+                cands = 0
+                for teacher_id, teacher_cands in self._teacher_cand_masks[lesson.id].items():
+                    if (self._teacher_mask[teacher_id] >> slot_index) & 1:
+                        cands |= teacher_cands
+                domain.append(cands)
+            self._domains.append(domain)
+            self._domain_sizes.append(sum(cands.bit_count() for cands in domain))
+        
+        # タスク間の関係
+        class_sets = {lesson.id: set(lesson.class_ids) for lesson in self.lessons}
+        self._clashes = []
+        self._sync_partners = []
+        for task, (lesson, unit_index) in enumerate(self._tasks):
+            clashes = []
+            partners = []
+            for other, (other_lesson, other_unit) in enumerate(self._tasks):
+                if other == task:
                     continue
-                
-                for teacher_id in lesson.teacher_ids:
-                    teacher = self.teachers[teacher_id]
-                    
-                    # 教員が担当可能な時間かチェック
-                    if not teacher.is_available(timeslot):
-                        continue
-                    
-                    # 配置を試みる
-                    assignment = Assignment(
-                        lesson=lesson,
-                        timeslot=timeslot,
-                        room=room,
-                        teacher_id=teacher_id
-                    )
-                    
-                    # 制約チェック
-                    if self._is_valid_placement(timetable, assignment):
-                        # 配置を追加
-                        timetable.add_assignment(assignment)
-                        
-                        # 次のタスクへ
-                        if self._backtrack(tasks, task_index + 1, timetable):
-                            return True
-                        
-                        # バックトラック
-                        timetable.assignments.pop()
-        
-        return False
+                if other_lesson.id == lesson.id or not class_sets[lesson.id].isdisjoint(class_sets[other_lesson.id]):
+                    clashes.append(other)
+                if (
+                    lesson.synchronization_id
+                    and other_lesson.synchronization_id == lesson.synchronization_id
+                    and other_unit == unit_index
+                ):
+                    partners.append(other)
+            self._clashes.append(clashes)
+            self._sync_partners.append(partners)
+        
+        # 時間枠を試す順序
+        if rng is None:
+            slot_order = list(range(len(self.timeslots)))
+            self._slot_orders = [slot_order] * len(self._tasks)
+        else:
+            self._slot_orders = []
+            for _ in self._tasks:
+                slot_order = list(range(len(self.timeslots)))
+                rng.shuffle(slot_order)
+                self._slot_orders.append(slot_order)
+        
+        self._unassigned = set(range(len(self._tasks)))
+        self._trail = []
+        self._pruned_by = [[] for _ in self._tasks]
+        self._placed_tasks = []
+        self._placed_slots = []
+        self._placed_cands = []
     
-    def _place_synchronized_lessons(
-        self,
-        sync_lessons: List[Lesson],
-        unit_index: int,
-        tasks: List[Tuple[Lesson, int]],
-        task_index: int,
-        timetable: Timetable
-    ) -> bool:
+    def _search(self) -> bool:
         """
-        同期制約のあるLessonを同時に配置
+        前方検査・衝突指向バックジャンプ付きのバックトラック
         
-        Args:
-            sync_lessons: 同期グループのLesson群
-            unit_index: 配置する単位インデックス
-            tasks: 全タスクリスト
-            task_index: 現在のタスクインデックス
-            timetable: 現在の時間割
+        残り候補が最も少ないタスクから配置する（動的MRV）。
+        配置のたびに未配置タスクのドメインから矛盾する候補を取り除き、
+        空になるタスクが出た時点でその枝を打ち切る。
+        候補を使い切った場合は、失敗の原因となった配置（衝突集合）のうち
+        最も深いものまで一気に戻る。
+        再帰呼び出しの代わりに明示的なスタックで探索する（スタックの添字が配置の深さ）。
+        衝突集合は失敗の原因となった配置の深さで、その最大値が戻り先になる。
+        空の場合はそれ以上戻っても解がない（または試行回数の上限に達した）ことを表す
         
         Returns:
-            配置に成功したか
+            解が見つかったか
         """
-        # 全ての同期Lessonで既に使用されているtimeslotを収集
-        already_used_timeslots = set()
-        for lesson in sync_lessons:
-            for a in timetable.assignments:
-                if a.lesson.id == lesson.id:
-                    already_used_timeslots.add(a.timeslot)
-        
-        # 各timeslotで全ての同期Lessonを配置できるか試す
-        for timeslot in self.timeslots:
-            if timeslot in already_used_timeslots:
-                continue
-            
-            # 各同期Lessonの配置を試みる
-            sync_assignments = []
-            placement_failed = False
-            
-            for lesson in sync_lessons:
-                # 適切な教室と教員を見つける
-                placed = False
+        num_slots = len(self.timeslots)
+        stack: List[_SearchFrame] = []
+        # 直前に失敗した子の衝突集合（Noneなら次の深さへ進む）
+        child_conflicts: Optional[Set[int]] = None
+        
+        while True:
+            if child_conflicts is None:
+                # 試行回数の上限チェック
+                self.attempt_count += 1
+                if self.attempt_count > self.max_attempts:
+                    child_conflicts = set()
+                    continue
                 
-                for room in self.rooms.values():
-                    if room.room_type != lesson.room_type_required:
-                        continue
-                    
-                    for teacher_id in lesson.teacher_ids:
-                        teacher = self.teachers[teacher_id]
-                        
-                        if not teacher.is_available(timeslot):
-                            continue
-                        
-                        assignment = Assignment(
-                            lesson=lesson,
-                            timeslot=timeslot,
-                            room=room,
-                            teacher_id=teacher_id
-                        )
-                        
-                        # 一時的な時間割で制約チェック
-                        temp_timetable = Timetable(assignments=timetable.assignments + sync_assignments)
-                        
-                        if self._is_valid_placement(temp_timetable, assignment):
-                            sync_assignments.append(assignment)
-                            placed = True
-                            break
-                    
-                    if placed:
-                        break
+                # 全てのタスクが配置された
+                if not self._unassigned:
+                    return True
                 
-                if not placed:
-                    placement_failed = True
-                    break
+                # 残り候補が最小のタスクを選択（同点なら難しさ順）
+                task = min(self._unassigned, key=lambda t: (self._domain_sizes[t], t))
+                self._unassigned.remove(task)
+                slot_order = self._slot_orders[task]
+                stack.append(_SearchFrame(
+                    task=task,
+                    slot_order=slot_order,
+                    slot_index=slot_order[0],
+                    cands=self._domains[task][slot_order[0]],
+                    equivalent_cands=self._equivalent_cands[self._tasks[task][0].id]
+                ))
+            else:
+                if not stack:
+                    return False
+                
+                # バックトラック
+                frame = stack[-1]
+                depth = len(stack) - 1
+                self._pop(frame.mark, depth)
+                if not child_conflicts or max(child_conflicts) < depth:
+                    # この配置は失敗と無関係なので、さらに上の深さへ戻る
+                    self._unassigned.add(frame.task)
+                    stack.pop()
+                    continue
+                frame.conflict_set |= child_conflicts
+                frame.conflict_set.discard(depth)
+                child_conflicts = None
             
-            # 全ての同期Lessonの配置に成功した場合
-            if not placement_failed and len(sync_assignments) == len(sync_lessons):
-                # 全ての配置を追加
-                for assignment in sync_assignments:
-                    timetable.add_assignment(assignment)
+            # 最も深いタスクの次の候補を配置
+            frame = stack[-1]
+            depth = len(stack) - 1
+            placed = False
+            while True:
+                if not frame.cands:
+                    frame.slot_pos += 1
+                    if frame.slot_pos >= num_slots:
+                        break
+                    frame.slot_index = frame.slot_order[frame.slot_pos]
+                    frame.cands = self._domains[frame.task][frame.slot_index]
+                    continue
                 
-                # 次のタスクへ（同期グループの数だけスキップ）
-                next_task_index = task_index + len(sync_lessons)
-                if self._backtrack(tasks, next_task_index, timetable):
-                    return True
+                # 下位ビットから順に候補を取り出す
+                low_bit = frame.cands & -frame.cands
+                cand_index = low_bit.bit_length() - 1
+                # この候補が失敗すれば入れ替え可能な候補も同じく失敗するので試さない
+                frame.cands &= ~frame.equivalent_cands[cand_index]
                 
-                # バックトラック
-                for _ in sync_assignments:
-                    timetable.assignments.pop()
-        
-        return False
+                frame.mark = len(self._trail)
+                wiped = self._push(frame.task, frame.slot_index, cand_index, depth)
+                if wiped >= 0:
+                    # 候補が尽きたタスクを枝刈りした配置が、この値の失敗原因
+                    frame.conflict_set.update(self._pruned_by[wiped])
+                    frame.conflict_set.discard(depth)
+                    self._pop(frame.mark, depth)
+                    continue
+                placed = True
+                break
+            
+            # 最も多く配置できた途中状態を記録（解が見つからなかった場合の診断用）
+            if placed and len(self._placed_tasks) > len(self._best_placement):
+                self._best_placement = [
+                    (self._tasks[task][0], slot_index, cand_index)
+                    for task, slot_index, cand_index in zip(
+                        self._placed_tasks, self._placed_slots, self._placed_cands
+                    )
+                ]
+            
+            if not placed:
+                # 候補を使い切った: このタスクのドメインを削った配置も原因に含めて戻る
+                self._unassigned.add(frame.task)
+                frame.conflict_set.update(self._pruned_by[frame.task])
+                stack.pop()
+                child_conflicts = frame.conflict_set
     
-    def _is_valid_placement(self, timetable: Timetable, new_assignment: Assignment) -> bool:
+    def _push(self, task: int, slot_index: int, cand_index: int, depth: int) -> int:
         """
-        新しい配置が制約を満たすかチェック
-        
-        Args:
-            timetable: 現在の時間割
-            new_assignment: 新しい配置
+        タスクを配置し、未配置タスクのドメインを枝刈りする（前方検査）
         
         Returns:
-            制約を満たすか
+            候補が尽きた未配置タスク（なければ -1）
         """
-        # 一時的に配置を追加
-        temp_timetable = Timetable(assignments=timetable.assignments + [new_assignment])
+        lesson, _ = self._tasks[task]
+        room, teacher_id = self._candidates[lesson.id][cand_index]
+        self._placed_tasks.append(task)
+        self._placed_slots.append(slot_index)
+        self._placed_cands.append(cand_index)
         
-        # 各制約をチェック
-        is_valid, _ = check_teacher_conflict(temp_timetable)
-        if not is_valid:
-            return False
+        # 同一Lessonの他unit・クラスを共有するタスクは同じ時間枠に置けない
+        for other in self._clashes[task]:
+            if other in self._unassigned:
+                self._prune(other, slot_index, self._domains[other][slot_index], depth)
         
-        is_valid, _ = check_room_conflict(temp_timetable)
-        if not is_valid:
-            return False
+        # 同じ教員・教室を使う候補は同じ時間枠に置けない
+        for other in self._unassigned:
+            other_lesson_id = self._tasks[other][0].id
+            conflicting = (
+                self._teacher_cand_masks[other_lesson_id].get(teacher_id, 0)
+                | self._room_cand_masks[other_lesson_id].get(room.id, 0)
+            )
+            self._prune(other, slot_index, self._domains[other][slot_index] & conflicting, depth)
         
-        is_valid, _ = check_class_conflict(temp_timetable)
-        if not is_valid:
-            return False
+        # 同期タスクは同じ時間枠以外に置けない
+        for other in self._sync_partners[task]:
+            if other in self._unassigned:
+                for other_slot, other_cands in enumerate(self._domains[other]):
+                    if other_slot != slot_index:
+                        self._prune(other, other_slot, other_cands, depth)
         
-        return True
+        for other in self._unassigned:
+            if self._domain_sizes[other] == 0:
+                return other
+        return -1
+    
+    def _prune(self, task: int, slot_index: int, removed: int, depth: int):
+        """ドメインから候補ビットを取り除き、取り消し用に記録"""
+        if not removed:
+            return
+        self._domains[task][slot_index] ^= removed
+        self._domain_sizes[task] -= removed.bit_count()
+        self._trail.append((task, slot_index, removed))
+        pruned_by = self._pruned_by[task]
+        if not pruned_by or pruned_by[-1] != depth:
+            pruned_by.append(depth)
+    
+    def _pop(self, mark: int, depth: int):
+        """最後の配置を取り消し、mark以降の枝刈りを元に戻す"""
+        self._placed_tasks.pop()
+        self._placed_slots.pop()
+        self._placed_cands.pop()
+        while len(self._trail) > mark:
+            task, slot_index, removed = self._trail.pop()
+            self._domains[task][slot_index] |= removed
+            self._domain_sizes[task] += removed.bit_count()
+            pruned_by = self._pruned_by[task]
+            if pruned_by and pruned_by[-1] == depth:
+                pruned_by.pop()
+    
+    def _build_timetable(self, placement: Optional[List[Tuple[Lesson, int, int]]] = None) -> Timetable:
+        """
+        配置から時間割を生成
+        
+        Args:
+            placement: (Lesson, slot_index, cand_index) のリスト（省略時は現在の配置済みタスク）
+        """
+        if placement is None:
+            placement = [
+                (self._tasks[task][0], slot_index, cand_index)
+                for task, slot_index, cand_index in zip(
+                    self._placed_tasks, self._placed_slots, self._placed_cands
+                )
+            ]
+        
+        timetable = Timetable()
+        for lesson, slot_index, cand_index in placement:
+            room, teacher_id = self._candidates[lesson.id][cand_index]
+            timetable.add_assignment(Assignment(
+                lesson=lesson,
+                timeslot=self.timeslots[slot_index],
+                room=room,
+                teacher_id=teacher_id
+            ))
+        return timetable
@@ -3,9 +3,14 @@
 
 全てのハード制約をチェックする検証関数群
 """
-from typing import List, Tuple, Dict, Set
+from typing import Callable, List, Tuple, Dict
 from collections import defaultdict
-from models import Timetable, Assignment, TimeSlot, Teacher, Room, Class, Lesson
+import numpy as np
+from models import Timetable, TimetableArrays, Assignment, TimeSlot, Teacher, Room, Class, Lesson
+
+# TimeSlot.index の順の全時間枠
+ALL_TIMESLOTS = TimeSlot.all_slots()
+SLOTS_PER_WEEK = len(ALL_TIMESLOTS)
 
 
 def check_teacher_conflict(timetable: Timetable) -> Tuple[bool, List[str]]:
@@ -15,23 +20,7 @@ def check_teacher_conflict(timetable: Timetable) -> Tuple[bool, List[str]]:
     Returns:
         (違反なし, エラーメッセージリスト)
     """
-    errors = []
-    # TimeSlot × Teacher の組み合わせでグループ化
-    teacher_slots: Dict[Tuple[TimeSlot, str], List[Assignment]] = defaultdict(list)
-    
-    for assignment in timetable.assignments:
-        key = (assignment.timeslot, assignment.teacher_id)
-        teacher_slots[key].append(assignment)
-    
-    # 同一時間枠に2つ以上の授業がある教員を検出
-    for (timeslot, teacher_id), assignments in teacher_slots.items():
-        if len(assignments) > 1:
-            lesson_names = [a.lesson.subject for a in assignments]
-            errors.append(
-                f"教員競合: 教員 {teacher_id} が {timeslot} に複数の授業を担当 " +
-                f"({', '.join(lesson_names)})"
-            )
-    
+    errors = _teacher_conflict_errors(_teacher_conflict_groups(timetable))
     return len(errors) == 0, errors
 
 
@@ -42,23 +31,7 @@ def check_room_conflict(timetable: Timetable) -> Tuple[bool, List[str]]:
     Returns:
         (違反なし, エラーメッセージリスト)
     """
-    errors = []
-    # TimeSlot × Room の組み合わせでグループ化
-    room_slots: Dict[Tuple[TimeSlot, str], List[Assignment]] = defaultdict(list)
-    
-    for assignment in timetable.assignments:
-        key = (assignment.timeslot, assignment.room.id)
-        room_slots[key].append(assignment)
-    
-    # 同一時間枠に2つ以上の授業がある教室を検出
-    for (timeslot, room_id), assignments in room_slots.items():
-        if len(assignments) > 1:
-            lesson_names = [a.lesson.subject for a in assignments]
-            errors.append(
-                f"教室競合: 教室 {assignments[0].room.name} が {timeslot} に複数の授業で使用 " +
-                f"({', '.join(lesson_names)})"
-            )
-    
+    errors = _room_conflict_errors(_room_conflict_groups(timetable))
     return len(errors) == 0, errors
 
 
@@ -69,34 +42,226 @@ def check_class_conflict(timetable: Timetable) -> Tuple[bool, List[str]]:
     Returns:
         (違反なし, エラーメッセージリスト)
     """
-    errors = []
-    # TimeSlot × Class の組み合わせでグループ化
-    class_slots: Dict[Tuple[TimeSlot, str], List[Assignment]] = defaultdict(list)
+    errors = _class_conflict_errors(_class_conflict_groups(timetable))
+    return len(errors) == 0, errors
+
+
+def check_all_conflicts(
+    timetable: Timetable,
+    fast_mode: bool = False,
+    fast_check: bool = False
+) -> Tuple[bool, List[str]]:
+    """
+    教員・教室・クラス競合の一括チェック
     
-    for assignment in timetable.assignments:
-        for class_id in assignment.lesson.class_ids:
-            key = (assignment.timeslot, class_id)
-            class_slots[key].append(assignment)
+    check_teacher_conflict / check_room_conflict / check_class_conflict と同じ結果を、
+    時間割を1回走査するだけで求める
     
-    # 同一時間枠に2つ以上の授業があるクラスを検出
-    for (timeslot, class_id), assignments in class_slots.items():
-        if len(assignments) > 1:
-            lesson_names = [a.lesson.subject for a in assignments]
-            errors.append(
-                f"クラス競合: クラス {class_id} が {timeslot} に複数の授業を受講 " +
-                f"({', '.join(lesson_names)})"
-            )
+    Args:
+        timetable: チェック対象の時間割
+        fast_mode: Trueなら最初に見つかった競合だけを報告してすぐに返す
+                   （違反の有無だけを知りたい場合用。メッセージには競合した2つの授業のみ含む）
+        fast_check: Trueならエラーメッセージを作らず、違反の有無だけを返す
     
+    Returns:
+        (違反なし, エラーメッセージリスト)
+    """
+    if fast_check:
+        arrays = timetable.as_arrays()
+        has_conflict = (
+            _has_duplicates(_teacher_slot_keys(arrays))
+            or _has_duplicates(_room_slot_keys(arrays))
+            or _has_duplicates(_class_slot_keys(arrays))
+        )
+        return not has_conflict, []
+    
+    if fast_mode:
+        return _first_conflict(timetable)
+    
+    # 列指向の配列は時間割ごとに1度だけ作られ、3種類のチェックで共有される
+    errors = (
+        _teacher_conflict_errors(_teacher_conflict_groups(timetable))
+        + _room_conflict_errors(_room_conflict_groups(timetable))
+        + _class_conflict_errors(_class_conflict_groups(timetable))
+    )
     return len(errors) == 0, errors
 
 
-def check_synchronization(timetable: Timetable, lessons: List[Lesson]) -> Tuple[bool, List[str]]:
+def _duplicate_groups(keys: np.ndarray) -> List[np.ndarray]:
+    """
+    同じキーを持つ要素が2つ以上あるグループを求める
+    
+    Returns:
+        グループごとの元の添字配列（グループはキーの初出順、グループ内は元の順）
+    """
+    if len(keys) < 2:
+        return []
+    # 安定ソートでキーごとに添字を並べ、隣り合うキーが変わる位置で区切る
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    duplicated = np.flatnonzero(ends - starts > 1)
+    if len(duplicated) == 0:
+        return []
+    # 各範囲の先頭は安定ソートによりキーの初出なので、その順に並べ替える
+    duplicated = duplicated[np.argsort(order[starts[duplicated]])]
+    return [order[starts[u]:ends[u]] for u in duplicated]
+
+
+def _has_duplicates(keys: np.ndarray) -> bool:
+    """
+    同じキーを持つ要素が2つ以上あるか
+    
+    キーは (コード × 30 + 時間枠) の非負整数なので、ソートせずbincountで数える
+    """
+    return len(keys) > 1 and np.bincount(keys).max() > 1
+
+
+def _teacher_slot_keys(arrays: TimetableArrays) -> np.ndarray:
+    """配置ごとの (教員, 時間枠) キー"""
+    return arrays.teacher.astype(np.int64) * SLOTS_PER_WEEK + arrays.slot
+
+
+def _room_slot_keys(arrays: TimetableArrays) -> np.ndarray:
+    """配置ごとの (教室, 時間枠) キー"""
+    return arrays.room.astype(np.int64) * SLOTS_PER_WEEK + arrays.slot
+
+
+def _class_slot_keys(arrays: TimetableArrays) -> np.ndarray:
+    """(配置, 対象クラス) の組ごとの (クラス, 時間枠) キー"""
+    return arrays.class_code.astype(np.int64) * SLOTS_PER_WEEK + arrays.slot[arrays.class_assignment]
+
+
+def _teacher_conflict_groups(timetable: Timetable) -> List[List[Assignment]]:
+    """同一時間枠・同一教員の配置が2つ以上あるグループ"""
+    keys = _teacher_slot_keys(timetable.as_arrays())
+    return [[timetable.assignments[i] for i in group] for group in _duplicate_groups(keys)]
+
+
+def _room_conflict_groups(timetable: Timetable) -> List[List[Assignment]]:
+    """同一時間枠・同一教室の配置が2つ以上あるグループ"""
+    keys = _room_slot_keys(timetable.as_arrays())
+    return [[timetable.assignments[i] for i in group] for group in _duplicate_groups(keys)]
+
+
+def _class_conflict_groups(timetable: Timetable) -> List[Tuple[str, List[Assignment]]]:
+    """同一時間枠・同一クラスの配置が2つ以上あるグループ (クラスID, 配置リスト)"""
+    arrays = timetable.as_arrays()
+    keys = _class_slot_keys(arrays)
+    return [
+        (
+            arrays.class_ids[arrays.class_code[group[0]]],
+            [timetable.assignments[i] for i in arrays.class_assignment[group]]
+        )
+        for group in _duplicate_groups(keys)
+    ]
+
+
+def _first_conflict(timetable: Timetable) -> Tuple[bool, List[str]]:
+    """
+    最初に見つかった教員・教室・クラス競合を1件だけ返す
+    
+    教員・教室・クラスごとの使用済み時間枠を30ビットの整数で持ち、
+    ビットANDで競合を判定する（競合した相手はメッセージ作成時にだけ探す）
+    """
+    teacher_busy: Dict[str, int] = defaultdict(int)
+    room_busy: Dict[str, int] = defaultdict(int)
+    class_busy: Dict[str, int] = defaultdict(int)
+    
+    assignments = timetable.assignments
+    for i, assignment in enumerate(assignments):
+        timeslot = assignment.timeslot
+        slot_bit = 1 << timeslot.index
+        
+        teacher_id = assignment.teacher_id
+        if teacher_busy[teacher_id] & slot_bit:
+            first = _earlier_assignment(assignments, i, lambda a: a.teacher_id == teacher_id)
+            return False, [
+                f"教員競合: 教員 {teacher_id} が {timeslot} に複数の授業を担当 " +
+                f"({first.lesson.subject}, {assignment.lesson.subject})"
+            ]
+        teacher_busy[teacher_id] |= slot_bit
+        
+        room_id = assignment.room.id
+        if room_busy[room_id] & slot_bit:
+            first = _earlier_assignment(assignments, i, lambda a: a.room.id == room_id)
+            return False, [
+                f"教室競合: 教室 {first.room.name} が {timeslot} に複数の授業で使用 " +
+                f"({first.lesson.subject}, {assignment.lesson.subject})"
+            ]
+        room_busy[room_id] |= slot_bit
+        
+        for class_id in assignment.lesson.class_ids:
+            if class_busy[class_id] & slot_bit:
+                first = _earlier_assignment(assignments, i, lambda a: class_id in a.lesson.class_ids)
+                return False, [
+                    f"クラス競合: クラス {class_id} が {timeslot} に複数の授業を受講 " +
+                    f"({first.lesson.subject}, {assignment.lesson.subject})"
+                ]
+            class_busy[class_id] |= slot_bit
+    
+    return True, []
+
+
+def _earlier_assignment(assignments: List[Assignment], end: int, uses_same: Callable[[Assignment], bool]) -> Assignment:
+    """assignments[end] と同じ時間枠で、同じ教員・教室・クラスを使う最初の配置を探す"""
+    slot_index = assignments[end].timeslot.index
+    # 同じ配置内で同じクラスが重複している場合は自身が相手になる
+    return next(
+        a for a in assignments[:end + 1]
+        if a.timeslot.index == slot_index and uses_same(a)
+    )
+
+
+def _teacher_conflict_errors(groups: List[List[Assignment]]) -> List[str]:
+    """教員競合のグループをエラーメッセージに変換"""
+    errors = []
+    for assignments in groups:
+        lesson_names = [a.lesson.subject for a in assignments]
+        errors.append(
+            f"教員競合: 教員 {assignments[0].teacher_id} が {assignments[0].timeslot} に複数の授業を担当 " +
+            f"({', '.join(lesson_names)})"
+        )
+    return errors
+
+
+def _room_conflict_errors(groups: List[List[Assignment]]) -> List[str]:
+    """教室競合のグループをエラーメッセージに変換"""
+    errors = []
+    for assignments in groups:
+        lesson_names = [a.lesson.subject for a in assignments]
+        errors.append(
+            f"教室競合: 教室 {assignments[0].room.name} が {assignments[0].timeslot} に複数の授業で使用 " +
+            f"({', '.join(lesson_names)})"
+        )
+    return errors
+
+
+def _class_conflict_errors(groups: List[Tuple[str, List[Assignment]]]) -> List[str]:
+    """クラス競合のグループをエラーメッセージに変換"""
+    errors = []
+    for class_id, assignments in groups:
+        lesson_names = [a.lesson.subject for a in assignments]
+        errors.append(
+            f"クラス競合: クラス {class_id} が {assignments[0].timeslot} に複数の授業を受講 " +
+            f"({', '.join(lesson_names)})"
+        )
+    return errors
+
+
+def check_synchronization(
+    timetable: Timetable,
+    lessons: List[Lesson],
+    fast_check: bool = False
+) -> Tuple[bool, List[str]]:
     """
     同時実施制約チェック: 同じSynchronization_IDを持つLessonが全て同一TimeSlotに配置されているか
     
     Args:
         timetable: チェック対象の時間割
         lessons: 全てのLessonリスト（同期IDをグループ化するため）
+        fast_check: Trueならエラーメッセージを作らず、違反の有無だけを返す
     
     Returns:
         (違反なし, エラーメッセージリスト)
@@ -109,51 +274,66 @@ def check_synchronization(timetable: Timetable, lessons: List[Lesson]) -> Tuple[
         if lesson.synchronization_id:
             sync_groups[lesson.synchronization_id].append(lesson)
     
+    if not sync_groups:
+        return True, errors
+    
+    # Lesson × TimeSlot の配置表（時間割の配列表現と一緒にキャッシュされる。
+    # 最後の行は時間割に現れないLesson用で常にFalse）
+    arrays = timetable.as_arrays()
+    lesson_rows = {lesson_id: code for code, lesson_id in enumerate(arrays.lesson_ids)}
+    placed = arrays.lesson_slots
+    
     # 各同期グループについて、全てのLessonが同じTimeSlotに配置されているかチェック
     for sync_id, sync_lessons in sync_groups.items():
-        # 各Lessonが配置されているTimeSlotを収集
-        lesson_timeslots: Dict[str, Set[TimeSlot]] = {}
-        
-        for lesson in sync_lessons:
-            assignments = [a for a in timetable.assignments if a.lesson.id == lesson.id]
-            timeslots = {a.timeslot for a in assignments}
-            lesson_timeslots[lesson.id] = timeslots
+        rows = [lesson_rows.get(lesson.id, -1) for lesson in sync_lessons]
+        group_slots = placed[rows]
+        # 全てのLessonが同じ時間枠に配置されていれば違反なし
+        if (group_slots == group_slots[0]).all():
+            continue
+        if fast_check:
+            return False, []
+        # グループ全員が配置されている時間枠
+        placed_by_all = np.logical_and.reduce(group_slots, axis=0)
         
-        # 全てのLessonのTimeSlotが一致しているかチェック
-        if len(lesson_timeslots) > 0:
-            # 各Lessonの全配置について、他のLessonも同じTimeSlotに配置されているかチェック
-            for lesson in sync_lessons:
-                lesson_slots = lesson_timeslots.get(lesson.id, set())
-                
-                for timeslot in lesson_slots:
-                    # 他の同期Lessonも同じTimeSlotに配置されているかチェック
-                    for other_lesson in sync_lessons:
-                        if other_lesson.id != lesson.id:
-                            other_slots = lesson_timeslots.get(other_lesson.id, set())
-                            if timeslot not in other_slots:
-                                errors.append(
-                                    f"同期制約違反: 同期ID '{sync_id}' のLesson '{lesson.subject}' と " +
-                                    f"'{other_lesson.subject}' が同じTimeSlotに配置されていない " +
-                                    f"('{lesson.subject}'は{timeslot}に配置)"
-                                )
+        # 各Lessonの配置のうち、他の同期Lessonが揃っていない時間枠だけを調べる
+        for lesson, row in zip(sync_lessons, rows):
+            for slot_index in np.flatnonzero(placed[row] & ~placed_by_all):
+                timeslot = ALL_TIMESLOTS[slot_index]
+                for other_lesson, other_row in zip(sync_lessons, rows):
+                    if other_lesson.id != lesson.id and not placed[other_row, slot_index]:
+                        errors.append(
+                            f"同期制約違反: 同期ID '{sync_id}' のLesson '{lesson.subject}' と " +
+                            f"'{other_lesson.subject}' が同じTimeSlotに配置されていない " +
+                            f"('{lesson.subject}'は{timeslot}に配置)"
+                        )
     
     return len(errors) == 0, errors
 
 
-def check_room_type(timetable: Timetable) -> Tuple[bool, List[str]]:
+def check_room_type(timetable: Timetable, fast_check: bool = False) -> Tuple[bool, List[str]]:
     """
     設備制約チェック: Lessonが要求するRoom_TypeとAssignされたRoomのタイプが一致しているか
     
+    Args:
+        timetable: チェック対象の時間割
+        fast_check: Trueならエラーメッセージを作らず、違反の有無だけを返す
+    
     Returns:
         (違反なし, エラーメッセージリスト)
     """
     errors = []
     
-    for assignment in timetable.assignments:
+    arrays = timetable.as_arrays()
+    mismatched = arrays.room_type != arrays.required_type
+    if fast_check:
+        return not mismatched.any(), errors
+    
+    for i in np.flatnonzero(mismatched):
+        assignment = timetable.assignments[i]
         required_type = assignment.lesson.room_type_required
         actual_type = assignment.room.room_type
         
-        if required_type != actual_type:
+        if required_type is not actual_type:
             errors.append(
                 f"教室タイプ不一致: Lesson '{assignment.lesson.subject}' は {required_type.value} が必要だが、" +
                 f"{actual_type.value} の教室 '{assignment.room.name}' が割り当てられている ({assignment.timeslot})"
@@ -164,7 +344,8 @@ def check_room_type(timetable: Timetable) -> Tuple[bool, List[str]]:
 
 def check_teacher_availability(
     timetable: Timetable,
-    teachers: Dict[str, Teacher]
+    teachers: Dict[str, Teacher],
+    fast_check: bool = False
 ) -> Tuple[bool, List[str]]:
     """
     教員稼働制約チェック: Teacherの担当可能時間内にLessonが配置されているか
@@ -172,13 +353,29 @@ def check_teacher_availability(
     Args:
         timetable: チェック対象の時間割
         teachers: 教員ID -> Teacherオブジェクトの辞書
+        fast_check: Trueならエラーメッセージを作らず、違反の有無だけを返す
     
     Returns:
         (違反なし, エラーメッセージリスト)
     """
     errors = []
     
-    for assignment in timetable.assignments:
+    # 時間割に現れる教員ごとの担当可能表 (教員コード × TimeSlot.index)
+    arrays = timetable.as_arrays()
+    # 教員不明の場合は全時間枠を担当不可として扱う
+    masks = np.array(
+        [teachers[teacher_id].availability_mask if teacher_id in teachers else 0
+         for teacher_id in arrays.teacher_ids],
+        dtype=np.int64
+    )
+    available = (masks[:, None] >> np.arange(SLOTS_PER_WEEK)) & 1 == 1
+    unavailable = ~available[arrays.teacher, arrays.slot]
+    if fast_check:
+        return not unavailable.any(), errors
+    
+    # 担当不可（または教員不明）の配置だけメッセージを作る
+    for i in np.flatnonzero(unavailable):
+        assignment = timetable.assignments[i]
         teacher_id = assignment.teacher_id
         teacher = teachers.get(teacher_id)
         
@@ -198,24 +395,36 @@ def check_teacher_availability(
     return len(errors) == 0, errors
 
 
-def check_lesson_units(timetable: Timetable, lessons: List[Lesson]) -> Tuple[bool, List[str]]:
+def check_lesson_units(
+    timetable: Timetable,
+    lessons: List[Lesson],
+    fast_check: bool = False
+) -> Tuple[bool, List[str]]:
     """
     週単位数チェック: 各Lessonが必要な週単位数だけ配置されているか
     
     Args:
         timetable: チェック対象の時間割
         lessons: 全てのLessonリスト
+        fast_check: Trueならエラーメッセージを作らず、違反の有無だけを返す
     
     Returns:
         (違反なし, エラーメッセージリスト)
     """
     errors = []
     
+    # Lessonコードごとの配置数を一度に数える
+    arrays = timetable.as_arrays()
+    counts = np.bincount(arrays.lesson, minlength=len(arrays.lesson_ids))
+    lesson_rows = {lesson_id: code for code, lesson_id in enumerate(arrays.lesson_ids)}
+    
     for lesson in lessons:
-        assignments = [a for a in timetable.assignments if a.lesson.id == lesson.id]
-        assigned_units = len(assignments)
+        code = lesson_rows.get(lesson.id)
+        assigned_units = 0 if code is None else int(counts[code])
         
         if assigned_units != lesson.units:
+            if fast_check:
+                return False, errors
             errors.append(
                 f"週単位数不一致: Lesson '{lesson.subject}' (ID: {lesson.id}) は週{lesson.units}コマ必要だが、" +
                 f"{assigned_units}コマしか配置されていない"
@@ -224,40 +433,114 @@ def check_lesson_units(timetable: Timetable, lessons: List[Lesson]) -> Tuple[boo
     return len(errors) == 0, errors
 
 
+def check_incremental(
+    timetable: Timetable,
+    assignment: Assignment,
+    teachers: Dict[str, Teacher]
+) -> bool:
+    """
+    差分チェック: 配置を1つ追加しても競合・教室タイプ・教員稼働制約を破らないか
+    
+    既存の配置は制約を満たしている前提で、追加する配置と同じ時間枠の配置だけを
+    索引から取り出して調べる。同時実施制約と週単位数は時間割全体で決まるため対象外
+    
+    Args:
+        timetable: 追加前の時間割
+        assignment: 追加しようとしている配置
+        teachers: 教員ID -> Teacherオブジェクトの辞書
+    
+    Returns:
+        追加しても違反がなければTrue
+    """
+    if assignment.lesson.room_type_required != assignment.room.room_type:
+        return False
+    
+    teacher = teachers.get(assignment.teacher_id)
+    if teacher is None or not teacher.is_available(assignment.timeslot):
+        return False
+    
+    class_ids = set(assignment.lesson.class_ids)
+    for other in timetable.get_assignments_by_timeslot(assignment.timeslot):
+        if other.teacher_id == assignment.teacher_id or other.room.id == assignment.room.id:
+            return False
+        if not class_ids.isdisjoint(other.lesson.class_ids):
+            return False
+    
+    return True
+
+
+def compile_validator(
+    teachers: Dict[str, Teacher],
+    lessons: List[Lesson],
+    fast_check: bool = False,
+    stop_on_first_failure: bool = False
+) -> Callable[[Timetable], Tuple[bool, List[str]]]:
+    """
+    入力データに合わせた統合検証関数を作成
+    
+    どの制約を調べるかは入力データで決まるため、作成時に一度だけ判定して
+    必要なチェックだけを並べた関数を返す（同期IDを持つLessonがなければ同時実施制約は省く）。
+    
+    Args:
+        teachers: 教員ID -> Teacherオブジェクトの辞書
+        lessons: 全てのLessonリスト
+        fast_check: Trueならエラーメッセージを作らず、最初に違反した制約で (False, []) を返す
+                    （探索中など違反の有無だけを知りたい場合用）
+        stop_on_first_failure: Trueなら最初に違反した制約のエラーメッセージだけを返し、
+                               残りの制約は調べない
+    
+    Returns:
+        時間割を受け取り (全制約を満たすか, エラーメッセージリスト) を返す関数
+    """
+    lessons = list(lessons)
+    stop_early = fast_check or stop_on_first_failure
+    
+    # 安く調べられて違反しやすい競合チェックを先頭に置く
+    checks: List[Callable[[Timetable], Tuple[bool, List[str]]]] = [
+        lambda timetable: check_all_conflicts(timetable, fast_check=fast_check)
+    ]
+    if any(lesson.synchronization_id for lesson in lessons):
+        checks.append(lambda timetable: check_synchronization(timetable, lessons, fast_check))
+    checks.append(lambda timetable: check_room_type(timetable, fast_check))
+    checks.append(lambda timetable: check_teacher_availability(timetable, teachers, fast_check))
+    checks.append(lambda timetable: check_lesson_units(timetable, lessons, fast_check))
+    
+    def validate(timetable: Timetable) -> Tuple[bool, List[str]]:
+        all_errors = []
+        for check in checks:
+            is_valid, errors = check(timetable)
+            if not is_valid:
+                all_errors.extend(errors)
+                if stop_early:
+                    return False, all_errors
+        return len(all_errors) == 0, all_errors
+    
+    return validate
+
+
 def is_valid_assignment(
     timetable: Timetable,
     teachers: Dict[str, Teacher],
-    lessons: List[Lesson]
+    lessons: List[Lesson],
+    fast_check: bool = False,
+    stop_on_first_failure: bool = False
 ) -> Tuple[bool, List[str]]:
     """
     統合検証関数: 全てのハード制約をチェック
     
+    同じ入力データで繰り返し検証する場合は compile_validator で作った関数を使い回す
+    
     Args:
         timetable: チェック対象の時間割
         teachers: 教員ID -> Teacherオブジェクトの辞書
         lessons: 全てのLessonリスト
+        fast_check: Trueならエラーメッセージを作らず、最初に違反した制約で (False, []) を返す
+        stop_on_first_failure: Trueなら最初に違反した制約のエラーメッセージだけを返す
     
     Returns:
         (全制約を満たすか, エラーメッセージリスト)
     """
-    all_errors = []
-    
-    # 各制約をチェック
-    checks = [
-        ("教員競合", check_teacher_conflict(timetable)),
-        ("教室競合", check_room_conflict(timetable)),
-        ("クラス競合", check_class_conflict(timetable)),
-        ("同時実施制約", check_synchronization(timetable, lessons)),
-        ("教室タイプ", check_room_type(timetable)),
-        ("教員稼働制約", check_teacher_availability(timetable, teachers)),
-        ("週単位数", check_lesson_units(timetable, lessons)),
-    ]
-    
-    for check_name, (is_valid, errors) in checks:
-        if not is_valid:
-            all_errors.extend(errors)
-    
-    return len(all_errors) == 0, all_errors
+    return compile_validator(teachers, lessons, fast_check, stop_on_first_failure)(timetable)
 
 
 def validate_input_data(
@@ -295,30 +578,36 @@ def validate_input_data(
         errors.append("LessonIDに重複があります")
     
     # Lessonの教員IDが存在するかチェック
+    # 参照されている教員IDの集合との差分で存在しないIDを求め、あればLesson順にメッセージを作る
     teacher_id_set = set(teacher_ids)
-    for lesson in lessons:
-        for teacher_id in lesson.teacher_ids:
-            if teacher_id not in teacher_id_set:
-                errors.append(
-                    f"Lesson '{lesson.subject}' に存在しない教員ID '{teacher_id}' が指定されています"
-                )
+    missing_teacher_ids = set().union(*(lesson.teacher_ids for lesson in lessons)) - teacher_id_set
+    if missing_teacher_ids:
+        for lesson in lessons:
+            for teacher_id in lesson.teacher_ids:
+                if teacher_id in missing_teacher_ids:
+                    errors.append(
+                        f"Lesson '{lesson.subject}' に存在しない教員ID '{teacher_id}' が指定されています"
+                    )
     
     # LessonのクラスIDが存在するかチェック
     class_id_set = set(class_ids)
-    for lesson in lessons:
-        for class_id in lesson.class_ids:
-            if class_id not in class_id_set:
-                errors.append(
-                    f"Lesson '{lesson.subject}' に存在しないクラスID '{class_id}' が指定されています"
-                )
+    missing_class_ids = set().union(*(lesson.class_ids for lesson in lessons)) - class_id_set
+    if missing_class_ids:
+        for lesson in lessons:
+            for class_id in lesson.class_ids:
+                if class_id in missing_class_ids:
+                    errors.append(
+                        f"Lesson '{lesson.subject}' に存在しないクラスID '{class_id}' が指定されています"
+                    )
     
     # 各クラスの週単位数合計が妥当かチェック（週30コマを超えないか）
+    # Lessonを一度だけ走査してクラスごとの単位数を集計する
+    units_by_class: Dict[str, int] = defaultdict(int)
+    for lesson in lessons:
+        for class_id in set(lesson.class_ids):
+            units_by_class[class_id] += lesson.units
     for class_obj in classes:
-        total_units = sum(
-            lesson.units
-            for lesson in lessons
-            if class_obj.id in lesson.class_ids
-        )
+        total_units = units_by_class.get(class_obj.id, 0)
         if total_units > 30:
             errors.append(
                 f"クラス '{class_obj.name}' の週単位数合計が {total_units} で、30を超えています"
@@ -13,10 +13,16 @@ from utils import (
     print_statistics, validate_and_print_errors
 )
 import time
+from functools import lru_cache
 
 
+@lru_cache(maxsize=1)
 def create_sample_data():
-    """サンプルデータの作成"""
+    """
+    サンプルデータの作成
+    
+    データは固定なので初回に作ったものを使い回す（変更されないようタプルで返す）
+    """
     
     # === 教員データ ===
     teachers = [
@@ -31,8 +37,8 @@ def create_sample_data():
     ]
     
     # 一部の教員に稼働制約を追加（例: 水曜午後は不可）
-    teachers[6].set_availability(TimeSlot(Weekday.WEDNESDAY, 5), False)
-    teachers[6].set_availability(TimeSlot(Weekday.WEDNESDAY, 6), False)
+    teachers[6].set_availability(TimeSlot.get(Weekday.WEDNESDAY, 5), False)
+    teachers[6].set_availability(TimeSlot.get(Weekday.WEDNESDAY, 6), False)
     
     # === 教室データ ===
     rooms = [
@@ -98,9 +104,10 @@ def create_sample_data():
         Lesson("L1C_Art", "美術1C", 2, ["T008"], ["1C"], RoomType.ART),
     ])
     
-    return teachers, rooms, classes, lessons
+    return tuple(teachers), tuple(rooms), tuple(classes), tuple(lessons)
 
 
+@lru_cache(maxsize=1)
 def create_sample_data_with_sync():
     """同期制約を含むサンプルデータ（選択科目のシミュレーション）"""
     
@@ -116,7 +123,7 @@ def create_sample_data_with_sync():
         Lesson("L1_Art_Elec", "選択美術", 2, ["T008"], ["1A", "1B", "1C"], RoomType.ART, synchronization_id="ELEC1"),
     ])
     
-    return teachers, rooms, classes, lessons
+    return teachers, rooms, classes, tuple(lessons)
 
 
 def demo_ortools_solver():
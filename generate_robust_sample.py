@@ -1,6 +1,18 @@
 import csv
+import itertools
 import os
 
+# CSV書き込みのバッファサイズ（行数が多いデータでも書き込み回数を抑える）
+CSV_BUFFER_SIZE = 1 << 20
+
+
+def write_csv(path, rows):
+    """行の並び（リストまたはジェネレータ）をCSVファイルに書き出す"""
+    with open(path, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        writer.writerows(rows)
+
+
 def generate_sample_data():
     os.makedirs("sample_data_robust", exist_ok=True)
     
@@ -18,9 +30,7 @@ def generate_sample_data():
         ["T009", "小林先生（家庭）"],
         ["T010", "加藤先生（情報）"],
     ]
-    with open("sample_data_robust/teachers.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(teachers)
+    write_csv("sample_data_robust/teachers.csv", teachers)
     
     # 2. Rooms (教室)
     rooms = [
@@ -35,9 +45,7 @@ def generate_sample_data():
         ["R_COM", "PC室", "computer", "40"],
         ["R_HOM", "家庭科室", "home_ec", "40"],
     ]
-    with open("sample_data_robust/rooms.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(rooms)
+    write_csv("sample_data_robust/rooms.csv", rooms)
     
     # 3. Classes (クラス)
     classes = [
@@ -46,13 +54,11 @@ def generate_sample_data():
         ["1B", "1年B組", "35"],
         ["1C", "1年C組", "35"],
     ]
-    with open("sample_data_robust/classes.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(classes)
+    write_csv("sample_data_robust/classes.csv", classes)
     
     # 4. Lessons (授業)
     # Header
-    lessons_data = [["lesson_id", "subject", "units", "teacher_ids", "class_ids", "room_type", "synchronization_id"]]
+    header = ["lesson_id", "subject", "units", "teacher_ids", "class_ids", "room_type", "synchronization_id"]
     
     curriculum = [
         # 科目, 単位数, 教員ID, 教室タイプ
@@ -66,34 +72,31 @@ def generate_sample_data():
         ("情報", 1, "T010", "computer"),
     ]
     
-    # 個別授業の生成
-    for cls in ["1A", "1B", "1C"]:
-        for subj, unit, tid, rtype in curriculum:
-            lessons_data.append([
-                f"{cls}_{subj}", # lesson_id
-                subj,            # subject
-                str(unit),       # units
-                tid,             # teacher_ids
-                cls,             # class_ids
-                rtype,           # room_type
-                ""               # synchronization_id
-            ])
+    # 個別授業の生成（units は csv.writer が文字列に変換する）
+    # lesson_id, subject, units, teacher_ids, class_ids, room_type, synchronization_id
+    individual_lessons = (
+        [f"{cls}_{subj}", subj, unit, tid, cls, rtype, ""]
+        for cls in ["1A", "1B", "1C"]
+        for subj, unit, tid, rtype in curriculum
+    )
 
     # 合同授業: 体育 (3クラス合同, 週3回)
-    lessons_data.append([
-        "ALL_PE", "体育", "3", "T006", "1A,1B,1C", "gym", ""
-    ])
+    joint_lessons = [
+        ["ALL_PE", "体育", "3", "T006", "1A,1B,1C", "gym", ""]
+    ]
     
     # LHR (各クラス担任, 同時間)
     homeroom_teachers = {"1A": "T001", "1B": "T002", "1C": "T003"}
-    for cls in ["1A", "1B", "1C"]:
-        lessons_data.append([
-            f"{cls}_LHR", "LHR", "1", homeroom_teachers[cls], cls, "general", "LHR_TIME"
-        ])
+    homeroom_lessons = (
+        [f"{cls}_LHR", "LHR", "1", homeroom_teachers[cls], cls, "general", "LHR_TIME"]
+        for cls in ["1A", "1B", "1C"]
+    )
         
-    with open("sample_data_robust/lessons.csv", "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerows(lessons_data)
+    # 行を溜め込まずにそのまま書き出す
+    write_csv(
+        "sample_data_robust/lessons.csv",
+        itertools.chain([header], individual_lessons, joint_lessons, homeroom_lessons)
+    )
         
     print("Robust sample data generated in 'sample_data_robust/'")
 
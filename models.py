@@ -3,13 +3,17 @@
 
 公立高校の時間割を表現するためのエンティティ定義
 """
+from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import List, Optional, Set
-from enum import Enum
+from functools import cached_property
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from enum import Enum, IntEnum
 
+import numpy as np
 
-class Weekday(Enum):
-    """曜日の列挙型"""
+
+class Weekday(IntEnum):
+    """曜日の列挙型（値は0始まりの整数で、そのまま添字や比較に使える）"""
     MONDAY = 0
     TUESDAY = 1
     WEDNESDAY = 2
@@ -33,6 +37,11 @@ class RoomType(Enum):
     HOME_EC = "home_ec"          # 家庭科室
 
 
+# 曜日の表示名（Weekday.valueの順）と、時間枠の表示文字列（TimeSlot.indexの順: "月1"〜"金6"）
+_WEEKDAY_KANJI = ("月", "火", "水", "木", "金")
+_TIMESLOT_STR = tuple(f"{kanji}{period}" for kanji in _WEEKDAY_KANJI for period in range(1, 7))
+
+
 @dataclass(frozen=True)
 class TimeSlot:
     """時間枠: 曜日 × 時限"""
@@ -43,44 +52,68 @@ class TimeSlot:
         if not 1 <= self.period <= 6:
             raise ValueError(f"Period must be between 1 and 6, got {self.period}")
 
+    @cached_property
+    def index(self) -> int:
+        """時間枠の通し番号（0-29, all_slots()の順）。辞書のキーや配列の添字に使う"""
+        return self.weekday.value * 6 + self.period - 1
+
+    def __hash__(self) -> int:
+        # 同じ時間枠は同じ通し番号になるため、フィールドのタプルではなく通し番号でハッシュする
+        return self.index
+
     def __str__(self) -> str:
-        weekday_names = {
-            Weekday.MONDAY: "月",
-            Weekday.TUESDAY: "火",
-            Weekday.WEDNESDAY: "水",
-            Weekday.THURSDAY: "木",
-            Weekday.FRIDAY: "金"
-        }
-        return f"{weekday_names[self.weekday]}{self.period}"
+        return _TIMESLOT_STR[self.index]
+
+    @classmethod
+    def get(cls, weekday: Weekday, period: int) -> 'TimeSlot':
+        """共有インスタンスを取得（同じ時間枠は常に同じオブジェクトになり、比較・ハッシュ検索が速い）"""
+        if not 1 <= period <= 6:
+            raise ValueError(f"Period must be between 1 and 6, got {period}")
+        return _ALL_TIMESLOTS[weekday.value * 6 + period - 1]
 
     @classmethod
     def all_slots(cls) -> List['TimeSlot']:
-        """全ての時間枠（5曜日×6時限=30コマ）を生成"""
-        slots = []
-        for weekday in Weekday.all():
-            for period in range(1, 7):
-                slots.append(cls(weekday=weekday, period=period))
-        return slots
+        """全ての時間枠（5曜日×6時限=30コマ）を取得"""
+        return list(_ALL_TIMESLOTS)
 
 
-@dataclass(frozen=True)
+# 全時間枠の共有インスタンス（TimeSlot.indexの順）
+_ALL_TIMESLOTS = tuple(
+    TimeSlot(weekday=weekday, period=period)
+    for weekday in Weekday.all()
+    for period in range(1, 7)
+)
+
+
+# 全時間枠（30コマ）が担当可能な状態のビットマスク
+FULL_AVAILABILITY_MASK = (1 << 30) - 1
+
+
+@dataclass(frozen=True, slots=True)
 class Teacher:
     """教員エンティティ"""
     id: str
     name: str
-    # 担当可能時間マトリクス: availability[weekday.value][period-1] = True/False
-    availability: List[List[bool]] = field(default_factory=lambda: [[True] * 6 for _ in range(5)], hash=False)
+    # 担当可能時間のビットマスク: TimeSlot.index のビットが立っていれば担当可能
+    availability_mask: int = field(default=FULL_AVAILABILITY_MASK, hash=False)
+
+    @property
+    def availability(self) -> List[List[bool]]:
+        """担当可能時間マトリクス: availability[weekday.value][period-1] = True/False"""
+        return [[bool(self.availability_mask >> (day * 6 + period) & 1) for period in range(6)]
+                for day in range(5)]
 
     def is_available(self, timeslot: TimeSlot) -> bool:
         """指定時間枠で担当可能かチェック"""
-        return self.availability[timeslot.weekday.value][timeslot.period - 1]
+        return bool(self.availability_mask >> timeslot.index & 1)
 
     def set_availability(self, timeslot: TimeSlot, available: bool):
-        """担当可能時間を設定 (frozenのため新しいリストを設定することはできないが、中身のboolは変えられる...いや、frozenだとself.availabilityへの再代入も禁止されるため、中身を変更する設計にするか、あるいはavailabilityをタプルにする必要がある)
-        ここでは簡易的に、availabilityの中身(mutable list)を書き換えるアプローチをとる。
-        frozen=Trueでも、フィールドがmutable(List)ならその中身は変更可能。
+        """担当可能時間を設定
+        frozen=Trueのため、object.__setattr__でビットマスクを書き換える。
         """
-        self.availability[timeslot.weekday.value][timeslot.period - 1] = available
+        bit = 1 << timeslot.index
+        mask = self.availability_mask | bit if available else self.availability_mask & ~bit
+        object.__setattr__(self, 'availability_mask', mask)
 
     @classmethod
     def create_with_full_availability(cls, id: str, name: str) -> 'Teacher':
@@ -90,10 +123,22 @@ class Teacher:
     @classmethod
     def create_with_no_availability(cls, id: str, name: str) -> 'Teacher':
         """全時間帯で担当不可の教員を作成（制約設定のベース用）"""
-        return cls(id=id, name=name, availability=[[False] * 6 for _ in range(5)])
+        return cls(id=id, name=name, availability_mask=0)
 
+    @classmethod
+    def from_availability_matrix(cls, id: str, name: str, matrix: List[List[bool]]) -> 'Teacher':
+        """担当可能時間マトリクス（5曜日×6時限）から教員を作成。
+        曜日や時限が足りない場合はIndexErrorを送出
+        """
+        mask = 0
+        for day in range(5):
+            for period in range(6):
+                if matrix[day][period]:
+                    mask |= 1 << (day * 6 + period)
+        return cls(id=id, name=name, availability_mask=mask)
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Room:
     """教室エンティティ"""
     id: str
@@ -105,7 +150,7 @@ class Room:
         return f"{self.name}({self.room_type.value}, 定員{self.capacity})"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Class:
     """HRクラス（ホームルームクラス）エンティティ"""
     id: str
@@ -116,18 +161,21 @@ class Class:
         return f"{self.name}({self.size}名)"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Lesson:
     """授業タスクエンティティ"""
     id: str
     subject: str  # 科目名
     units: int  # 週単位数（週に何コマ必要か）
-    teacher_ids: List[str]  # 担当教員IDリスト（複数教員による授業も可）
-    class_ids: List[str]  # 対象クラスIDリスト（合同クラスも可）
+    teacher_ids: Tuple[str, ...]  # 担当教員IDリスト（複数教員による授業も可）
+    class_ids: Tuple[str, ...]  # 対象クラスIDリスト（合同クラスも可）
     room_type_required: RoomType  # 必要な教室タイプ
     synchronization_id: Optional[str] = None  # 同期ID（同じIDの授業は同一時間枠に配置）
 
     def __post_init__(self):
+        # リストで渡されてもタプルに揃える（frozenのためobject.__setattr__で設定）
+        object.__setattr__(self, 'teacher_ids', tuple(self.teacher_ids))
+        object.__setattr__(self, 'class_ids', tuple(self.class_ids))
         if self.units < 1:
             raise ValueError(f"Units must be at least 1, got {self.units}")
         if not self.teacher_ids:
@@ -140,7 +188,7 @@ class Lesson:
         return f"{self.subject} (週{self.units}コマ){sync_info}"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Assignment:
     """授業配置: 1つのLessonを特定のTimeSlot、Room、Teacherに割り当て"""
     lesson: Lesson
@@ -149,43 +197,172 @@ class Assignment:
     teacher_id: str  # 実際に担当する教員ID（lesson.teacher_idsから選択）
 
     def __post_init__(self):
+        # 時間枠は共有インスタンスに差し替える（frozenのためobject.__setattr__で設定）
+        object.__setattr__(self, 'timeslot', _ALL_TIMESLOTS[self.timeslot.index])
         if self.teacher_id not in self.lesson.teacher_ids:
             raise ValueError(
-                f"Teacher {self.teacher_id} is not in lesson's teacher list: {self.lesson.teacher_ids}"
+                f"Teacher {self.teacher_id} is not in lesson's teacher list: {list(self.lesson.teacher_ids)}"
             )
 
     def __str__(self) -> str:
         return f"{self.timeslot}: {self.lesson.subject} @ {self.room.name} by {self.teacher_id}"
 
 
+class TimetableArrays(NamedTuple):
+    """
+    時間割の列指向（SoA）表現: 配置ごとの値を並列のint32配列で持つ
+    
+    教員・教室・Lesson・クラスは *_ids の添字（コード）で表す。
+    Lessonの対象クラスはCSR形式（lesson_class_indptr / lesson_class_data）で持ち、
+    それを配置ごとに展開した (配置の添字, クラスコード) の組も持つ
+    """
+    slot: np.ndarray  # TimeSlot.index
+    teacher: np.ndarray  # teacher_ids の添字
+    room: np.ndarray  # room_ids の添字
+    lesson: np.ndarray  # lesson_ids の添字
+    room_type: np.ndarray  # 割り当てられた教室のタイプ（ROOM_TYPE_CODES）
+    required_type: np.ndarray  # Lessonが要求する教室タイプ（ROOM_TYPE_CODES）
+    lesson_class_indptr: np.ndarray  # Lessonコード l のクラスは lesson_class_data[indptr[l]:indptr[l+1]]
+    lesson_class_data: np.ndarray  # class_ids の添字
+    class_assignment: np.ndarray  # クラスごとの行: 配置の添字
+    class_code: np.ndarray  # クラスごとの行: class_ids の添字
+    lesson_slots: np.ndarray  # bool (Lessonコード数 + 1) × 30: Lessonが配置されている時間枠（最後の行は常にFalse）
+    teacher_ids: List[str]
+    room_ids: List[str]
+    lesson_ids: List[str]
+    class_ids: List[str]
+
+
+# RoomType -> TimetableArraysで使う整数コード
+ROOM_TYPE_CODES: Dict[RoomType, int] = {room_type: code for code, room_type in enumerate(RoomType)}
+
+
 @dataclass
 class Timetable:
     """時間割全体: Assignmentのコレクション"""
     assignments: List[Assignment] = field(default_factory=list)
+    # 検索用の索引（add_assignmentで更新）
+    _by_timeslot: Dict[TimeSlot, List[Assignment]] = field(init=False, repr=False, compare=False)
+    _by_teacher: Dict[str, List[Assignment]] = field(init=False, repr=False, compare=False)
+    _by_room_id: Dict[str, List[Assignment]] = field(init=False, repr=False, compare=False)
+    _by_class_id: Dict[str, List[Assignment]] = field(init=False, repr=False, compare=False)
+    _by_lesson_id: Dict[str, List[Assignment]] = field(init=False, repr=False, compare=False)
+    # as_arrays() の結果（配置が変わると破棄）
+    _arrays: Optional[TimetableArrays] = field(init=False, repr=False, compare=False, default=None)
+
+    def __post_init__(self):
+        self.rebuild_indexes()
+
+    def rebuild_indexes(self):
+        """索引を作り直す（assignmentsを直接変更した場合に呼ぶ）"""
+        self._by_timeslot = defaultdict(list)
+        self._by_teacher = defaultdict(list)
+        self._by_room_id = defaultdict(list)
+        self._by_class_id = defaultdict(list)
+        self._by_lesson_id = defaultdict(list)
+        self._arrays = None
+        for assignment in self.assignments:
+            self._index_assignment(assignment)
+
+    def _index_assignment(self, assignment: Assignment):
+        """配置を各索引に登録"""
+        self._by_timeslot[assignment.timeslot].append(assignment)
+        self._by_teacher[assignment.teacher_id].append(assignment)
+        self._by_room_id[assignment.room.id].append(assignment)
+        for class_id in assignment.lesson.class_ids:
+            self._by_class_id[class_id].append(assignment)
+        self._by_lesson_id[assignment.lesson.id].append(assignment)
 
     def add_assignment(self, assignment: Assignment):
         """配置を追加"""
         self.assignments.append(assignment)
+        self._index_assignment(assignment)
+        self._arrays = None
+
+    def as_arrays(self) -> TimetableArrays:
+        """配置を列指向の整数配列に変換（結果は配置が変わるまで再利用）"""
+        if self._arrays is not None:
+            return self._arrays
+
+        teacher_codes: Dict[str, int] = {}
+        room_codes: Dict[str, int] = {}
+        lesson_codes: Dict[str, int] = {}
+        class_codes: Dict[str, int] = {}
+        slots = []
+        teachers = []
+        rooms = []
+        lessons = []
+        room_types = []
+        required_types = []
+        # Lessonの対象クラス（CSR形式）。クラスの展開はLessonごとに1度だけ行う
+        lesson_class_indptr = [0]
+        lesson_class_data = []
+        for assignment in self.assignments:
+            lesson = assignment.lesson
+            slots.append(assignment.timeslot.index)
+            teachers.append(teacher_codes.setdefault(assignment.teacher_id, len(teacher_codes)))
+            rooms.append(room_codes.setdefault(assignment.room.id, len(room_codes)))
+            lesson_code = lesson_codes.setdefault(lesson.id, len(lesson_codes))
+            if lesson_code == len(lesson_class_indptr) - 1:
+                for class_id in lesson.class_ids:
+                    lesson_class_data.append(class_codes.setdefault(class_id, len(class_codes)))
+                lesson_class_indptr.append(len(lesson_class_data))
+            lessons.append(lesson_code)
+            room_types.append(ROOM_TYPE_CODES[assignment.room.room_type])
+            required_types.append(ROOM_TYPE_CODES[lesson.room_type_required])
+
+        lesson_array = np.array(lessons, dtype=np.int32)
+        indptr = np.array(lesson_class_indptr, dtype=np.int32)
+        data = np.array(lesson_class_data, dtype=np.int32)
+        # 配置ごとにLessonのクラスを展開: 配置 i の行は data[indptr[l]:indptr[l+1]] (l = lesson[i])
+        starts = indptr[lesson_array]
+        counts = indptr[lesson_array + 1] - starts
+        class_assignment = np.repeat(np.arange(len(lesson_array), dtype=np.int32), counts)
+        offsets = np.arange(len(class_assignment), dtype=np.int32) - np.repeat(np.cumsum(counts) - counts, counts)
+        class_code = data[np.repeat(starts, counts) + offsets]
+        # Lessonごとの配置済み時間枠。最後の行は時間割に現れないLessonの参照用
+        lesson_slots = np.zeros((len(lesson_codes) + 1, len(TimeSlot.all_slots())), dtype=bool)
+        slot_array = np.array(slots, dtype=np.int32)
+        lesson_slots[lesson_array, slot_array] = True
+
+        self._arrays = TimetableArrays(
+            slot=slot_array,
+            teacher=np.array(teachers, dtype=np.int32),
+            room=np.array(rooms, dtype=np.int32),
+            lesson=lesson_array,
+            room_type=np.array(room_types, dtype=np.int32),
+            required_type=np.array(required_types, dtype=np.int32),
+            lesson_class_indptr=indptr,
+            lesson_class_data=data,
+            class_assignment=class_assignment,
+            class_code=class_code.astype(np.int32),
+            lesson_slots=lesson_slots,
+            teacher_ids=list(teacher_codes),
+            room_ids=list(room_codes),
+            lesson_ids=list(lesson_codes),
+            class_ids=list(class_codes),
+        )
+        return self._arrays
 
     def get_assignments_by_timeslot(self, timeslot: TimeSlot) -> List[Assignment]:
         """特定時間枠の配置を取得"""
-        return [a for a in self.assignments if a.timeslot == timeslot]
+        return list(self._by_timeslot.get(timeslot, ()))
 
     def get_assignments_by_teacher(self, teacher_id: str) -> List[Assignment]:
         """特定教員の配置を取得"""
-        return [a for a in self.assignments if a.teacher_id == teacher_id]
+        return list(self._by_teacher.get(teacher_id, ()))
 
     def get_assignments_by_room(self, room_id: str) -> List[Assignment]:
         """特定教室の配置を取得"""
-        return [a for a in self.assignments if a.room.id == room_id]
+        return list(self._by_room_id.get(room_id, ()))
 
     def get_assignments_by_class(self, class_id: str) -> List[Assignment]:
         """特定クラスの配置を取得"""
-        return [a for a in self.assignments if class_id in a.lesson.class_ids]
+        return list(self._by_class_id.get(class_id, ()))
 
     def get_assignments_by_lesson(self, lesson_id: str) -> List[Assignment]:
         """特定Lessonの全配置を取得"""
-        return [a for a in self.assignments if a.lesson.id == lesson_id]
+        return list(self._by_lesson_id.get(lesson_id, ()))
 
     def __len__(self) -> int:
         return len(self.assignments)
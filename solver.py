@@ -3,13 +3,38 @@
 
 Google OR-Toolsの制約プログラミングソルバーを使用した時間割生成
 """
+import os
+from collections import defaultdict
 from typing import List, Dict, Optional, Tuple
 from ortools.sat.python import cp_model
 from models import (
     Teacher, Room, Class, Lesson, TimeSlot, Assignment, Timetable,
-    Weekday, RoomType
+    Weekday, RoomType, FULL_AVAILABILITY_MASK
 )
-from constraints import is_valid_assignment
+from constraints import compile_validator
+from backtrack_solver import BacktrackSolver
+
+# 変数キーのビット詰めで各要素に割り当てるビット数（Lesson番号は残りの上位ビット）
+_UNIT_BITS = 8
+_TIMESLOT_BITS = 8
+_ROOM_BITS = 16
+_TEACHER_BITS = 16
+
+
+class _SearchMonitor(cp_model.CpSolverSolutionCallback):
+    """
+    実行中の探索を外から打ち切るためのコールバック
+    
+    解の値は保持しない（打ち切られた探索でも解があれば状態はFEASIBLEになり、
+    値はレスポンスから取り出せる）。見つかった解の数だけを数える。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.solution_count = 0
+    
+    def OnSolutionCallback(self):
+        self.solution_count += 1
 
 
 class TimetableSolver:
@@ -20,49 +45,245 @@ class TimetableSolver:
         teachers: List[Teacher],
         rooms: List[Room],
         classes: List[Class],
-        lessons: List[Lesson]
+        lessons: List[Lesson],
+        debug_names: bool = False,
+        use_no_overlap: bool = False
     ):
+        """
+        Args:
+            debug_names: Trueなら配置変数にLesson・unit・時間枠・教室・教員を表す名前を付ける
+                         （モデルを出力して調べる場合用。名前は求解には使われない）
+            use_no_overlap: Trueなら教員・教室・クラス競合を、配置ごとの長さ1の区間変数と
+                            資源ごとのNoOverlap制約で表す（Falseならtimeslotごとの AtMostOne）
+        """
+        self.debug_names = debug_names
+        self.use_no_overlap = use_no_overlap
         self.teachers = {t.id: t for t in teachers}
         self.rooms = {r.id: r for r in rooms}
         self.classes = {c.id: c for c in classes}
         self.lessons = {l.id: l for l in lessons}
+        # 単位数が揃っていない同期グループ（unitの昇順の制約2bの対象外）
+        sync_units: Dict[str, set] = defaultdict(set)
+        for lesson in lessons:
+            if lesson.synchronization_id:
+                sync_units[lesson.synchronization_id].add(lesson.units)
+        self._mixed_sync_ids = {sync_id for sync_id, units in sync_units.items() if len(units) > 1}
+        # クラスID -> そのクラスが受けるLessonのID（Lessonの並び順）
+        self.lessons_by_class: Dict[str, List[str]] = defaultdict(list)
+        for lesson in lessons:
+            for class_id in dict.fromkeys(lesson.class_ids):
+                self.lessons_by_class[class_id].append(lesson.id)
         
         self.timeslots = TimeSlot.all_slots()
+        self.weekdays = tuple(Weekday.all())
+        # 曜日ごとの時間枠（1限から順）
+        self.slots_by_day: Dict[Weekday, List[TimeSlot]] = {
+            weekday: [TimeSlot.get(weekday, period) for period in range(1, 7)]
+            for weekday in self.weekdays
+        }
+        # 変数キーのビット詰め用に、文字列IDを通し番号に対応付ける
+        self._lesson_ids = list(self.lessons)
+        self._room_ids = list(self.rooms)
+        self._teacher_ids = list(self.teachers)
+        self._lesson_no = {lesson_id: i for i, lesson_id in enumerate(self._lesson_ids)}
+        self._room_no = {room_id: i for i, room_id in enumerate(self._room_ids)}
+        self._teacher_no = {teacher_id: i for i, teacher_id in enumerate(self._teacher_ids)}
+        if len(self._room_ids) >= 1 << _ROOM_BITS or len(self._teacher_ids) >= 1 << _TEACHER_BITS:
+            raise ValueError("教室数または教員数が多すぎます")
+        if any(lesson.units >= 1 << _UNIT_BITS for lesson in lessons):
+            raise ValueError("Lessonの単位数が多すぎます")
+        # 生成した時間割の検証関数（入力データに合わせて一度だけ作る）
+        self._validate = compile_validator(self.teachers, list(self.lessons.values()))
         
         self.model = cp_model.CpModel()
-        self.variables: Dict = {}
+        # ビット詰めした変数キー（_pack_key参照） -> 配置変数
+        self.variables: Dict[int, cp_model.IntVar] = {}
+        # 制約ごとに変数を取り出すための索引（setup_variablesで作成）
+        self.by_lesson_unit: Dict[Tuple[str, int], List[cp_model.IntVar]] = defaultdict(list)
+        self.by_lesson_unit_ts: Dict[Tuple[str, int, TimeSlot], List[cp_model.IntVar]] = defaultdict(list)
+        self.by_lesson_ts: Dict[Tuple[str, TimeSlot], List[cp_model.IntVar]] = defaultdict(list)
+        self.by_teacher_ts: Dict[Tuple[str, TimeSlot], List[cp_model.IntVar]] = defaultdict(list)
+        self.by_room_ts: Dict[Tuple[str, TimeSlot], List[cp_model.IntVar]] = defaultdict(list)
+        self.by_class_ts: Dict[Tuple[str, TimeSlot], List[cp_model.IntVar]] = defaultdict(list)
+        # (クラスID, 科目, 曜日) -> その日のコマ数（制約7で1日2コマ以上を許す場合に作成）
+        self.day_counts: Dict[Tuple[str, str, Weekday], cp_model.IntVar] = {}
+        # 事前に除外した（変数を作らなかった）配置の数
+        self.pruned_variable_count = 0
+        # 配置変数の添字 -> 区間変数（use_no_overlap の場合に作成）
+        self.intervals: Dict[int, cp_model.IntervalVar] = {}
+        # 変数と制約を作成済みか（build参照）
+        self._built = False
+        # 実行中の探索のコールバック（stop_search参照）
+        self._monitor: Optional[_SearchMonitor] = None
         
     def setup_variables(self):
         """
         決定変数を定義
         
         各Lessonの各配置（units分）に対して:
-        - assignment[(lesson_id, unit_index, timeslot, room_id, teacher_id)] = BoolVar
+        - variables[_pack_key(lesson_id, unit_index, timeslot, room_id, teacher_id)] = BoolVar
         
         True = その配置が選択される
+        
+        あわせて Lesson・unit・教員・教室・クラスと時間枠ごとの索引に変数を登録する
         """
+        # 教室タイプごとの教室（変数を作るループの外で一度だけ求める）
+        rooms_by_type: Dict[RoomType, List[Room]] = defaultdict(list)
+        for room in self.rooms.values():
+            rooms_by_type[room.room_type].append(room)
+        # 時間枠の集合はビットマスク（bit i = TimeSlot.index が i の時間枠）で表す
+        # 教員ごとの担当可能な時間枠
+        available_masks = {
+            teacher_id: teacher.availability_mask
+            for teacher_id, teacher in self.teachers.items()
+        }
+        # Lessonごとの、教室と担当可能な教員がそろう時間枠
+        lesson_masks: Dict[str, int] = {}
+        for lesson in self.lessons.values():
+            mask = 0
+            if rooms_by_type.get(lesson.room_type_required):
+                for teacher_id in lesson.teacher_ids:
+                    mask |= available_masks[teacher_id]
+            lesson_masks[lesson.id] = mask
+        unit_masks = self._synchronized_unit_masks(lesson_masks)
+        
         for lesson in self.lessons.values():
+            # 適切な教室タイプの教室
+            eligible_rooms = rooms_by_type.get(lesson.room_type_required, [])
+            
+            masks_by_unit = [
+                unit_masks.get((lesson.id, unit_index), lesson_masks[lesson.id])
+                for unit_index in range(lesson.units)
+            ]
+            if self._has_ordered_units(lesson):
+                masks_by_unit = self._unit_order_windows(masks_by_unit[0], lesson.units)
+            
             # 各Lessonはunits回配置される必要がある
             for unit_index in range(lesson.units):
+                unit_mask = masks_by_unit[unit_index]
                 # 各TimeSlotについて
                 for timeslot in self.timeslots:
-                    # 適切な教室タイプの教室について
-                    eligible_rooms = [
-                        room for room in self.rooms.values()
-                        if room.room_type == lesson.room_type_required
-                    ]
-                    
+                    bit = 1 << timeslot.index
+                    if not unit_mask & bit:
+                        # 同期相手が置けない、またはunitの順序から入りえない時間枠
+                        # （制約2b・6で必ず0になる変数は作らない）
+                        if lesson_masks[lesson.id] & bit:
+                            self.pruned_variable_count += sum(
+                                bool(available_masks[teacher_id] & bit)
+                                for teacher_id in lesson.teacher_ids
+                            ) * len(eligible_rooms)
+                        continue
                     for room in eligible_rooms:
                         # 担当可能な教員について
                         for teacher_id in lesson.teacher_ids:
-                            teacher = self.teachers[teacher_id]
-                            
                             # 教員が担当可能な時間のみ変数を作成
-                            if teacher.is_available(timeslot):
-                                var_name = f"L{lesson.id}_U{unit_index}_T{timeslot}_R{room.id}_Teach{teacher_id}"
+                            if available_masks[teacher_id] & bit:
+                                if self.debug_names:
+                                    var_name = f"L{lesson.id}_U{unit_index}_T{timeslot}_R{room.id}_Teach{teacher_id}"
+                                else:
+                                    var_name = ""
                                 var = self.model.NewBoolVar(var_name)
-                                # キーをオブジェクトではなくID（文字列やタプル）に変更してハッシュ化エラーを回避
-                                self.variables[(lesson.id, unit_index, timeslot, room.id, teacher_id)] = var
+                                key = self._pack_key(lesson.id, unit_index, timeslot, room.id, teacher_id)
+                                self.variables[key] = var
+                                self._index_variable(var, lesson, unit_index, timeslot, room.id, teacher_id)
+    
+    def _has_ordered_units(self, lesson: Lesson) -> bool:
+        """制約2b（unitを時間枠の昇順に並べる）の対象となるLessonか"""
+        return lesson.units > 1 and lesson.synchronization_id not in self._mixed_sync_ids
+    
+    def _unit_order_windows(self, mask: int, units: int) -> List[int]:
+        """
+        unitを時間枠の昇順に並べるとき、各unitが入りうる時間枠（ビットマスク）を求める
+        
+        unit u の前には u 個、後ろには units-1-u 個の時間枠が必要なため、
+        置ける時間枠を昇順に並べたときの u 番目から (len - units + u) 番目までに限られる。
+        置ける時間枠がunits未満の場合は絞り込まない（制約2で解なしになる）。
+        """
+        bits = [1 << i for i in range(len(self.timeslots)) if mask >> i & 1]
+        if len(bits) < units:
+            return [mask] * units
+        return [sum(bits[u:len(bits) - units + u + 1]) for u in range(units)]
+    
+    def _synchronized_unit_masks(self, lesson_masks: Dict[str, int]) -> Dict[Tuple[str, int], int]:
+        """
+        同期グループのunitごとに、グループ内の全Lessonが置ける時間枠（ビットマスク）を求める
+        
+        unit同士の対応は制約6と同じ（グループ先頭のLessonの単位数まで、
+        そのunitを持つLessonが2つ以上ある場合のみ）。
+        
+        Returns:
+            (lesson_id, unit_index) -> 置ける時間枠のビットマスク（同期の対象でないunitは含まない）
+        """
+        sync_groups: Dict[str, List[Lesson]] = defaultdict(list)
+        for lesson in self.lessons.values():
+            if lesson.synchronization_id:
+                sync_groups[lesson.synchronization_id].append(lesson)
+        
+        unit_masks: Dict[Tuple[str, int], int] = {}
+        for sync_lessons in sync_groups.values():
+            if len(sync_lessons) < 2:
+                continue
+            for unit_index in range(sync_lessons[0].units):
+                unit_lessons = [l for l in sync_lessons if unit_index < l.units]
+                if len(unit_lessons) < 2:
+                    continue
+                common = FULL_AVAILABILITY_MASK
+                for lesson in unit_lessons:
+                    common &= lesson_masks[lesson.id]
+                for lesson in unit_lessons:
+                    unit_masks[(lesson.id, unit_index)] = common
+        return unit_masks
+    
+    def _pack_key(
+        self,
+        lesson_id: str,
+        unit_index: int,
+        timeslot: TimeSlot,
+        room_id: str,
+        teacher_id: str
+    ) -> int:
+        """配置を1つの整数キーにビット詰めする（5要素のタプルより省メモリ）"""
+        key = self._lesson_no[lesson_id]
+        key = (key << _UNIT_BITS) | unit_index
+        key = (key << _TIMESLOT_BITS) | timeslot.index
+        key = (key << _ROOM_BITS) | self._room_no[room_id]
+        return (key << _TEACHER_BITS) | self._teacher_no[teacher_id]
+    
+    def _unpack_key(self, key: int) -> Tuple[str, int, TimeSlot, str, str]:
+        """_pack_key の逆変換: (lesson_id, unit_index, timeslot, room_id, teacher_id)"""
+        teacher_no = key & ((1 << _TEACHER_BITS) - 1)
+        key >>= _TEACHER_BITS
+        room_no = key & ((1 << _ROOM_BITS) - 1)
+        key >>= _ROOM_BITS
+        timeslot_index = key & ((1 << _TIMESLOT_BITS) - 1)
+        key >>= _TIMESLOT_BITS
+        unit_index = key & ((1 << _UNIT_BITS) - 1)
+        lesson_no = key >> _UNIT_BITS
+        return (
+            self._lesson_ids[lesson_no],
+            unit_index,
+            self.timeslots[timeslot_index],
+            self._room_ids[room_no],
+            self._teacher_ids[teacher_no]
+        )
+    
+    def _index_variable(
+        self,
+        var: cp_model.IntVar,
+        lesson: Lesson,
+        unit_index: int,
+        timeslot: TimeSlot,
+        room_id: str,
+        teacher_id: str
+    ):
+        """変数を各索引に登録（索引内の並びは変数の作成順）"""
+        self.by_lesson_unit[(lesson.id, unit_index)].append(var)
+        self.by_lesson_unit_ts[(lesson.id, unit_index, timeslot)].append(var)
+        self.by_lesson_ts[(lesson.id, timeslot)].append(var)
+        self.by_teacher_ts[(teacher_id, timeslot)].append(var)
+        self.by_room_ts[(room_id, timeslot)].append(var)
+        for class_id in dict.fromkeys(lesson.class_ids):
+            self.by_class_ts[(class_id, timeslot)].append(var)
     
     def add_hard_constraints(self):
         """全てのハード制約をモデルに追加"""
@@ -71,62 +292,97 @@ class TimetableSolver:
         for lesson in self.lessons.values():
             for unit_index in range(lesson.units):
                 # このunitに関する全ての変数
-                unit_vars = [
-                    var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                    if lid == lesson.id and uid == unit_index
-                ]
+                unit_vars = self.by_lesson_unit.get((lesson.id, unit_index), [])
                 # 必ず1つが選択される
                 if unit_vars:
-                    self.model.Add(sum(unit_vars) == 1)
+                    self.model.AddExactlyOne(unit_vars)
         
         # 制約2: 同一Lessonの異なるunitは異なるtimeslotに配置
+        # 各unitは制約1でちょうど1つに配置されるため、(Lesson, timeslot) ごとに
+        # 全unitの変数をまとめて高々1つにすればunitの組ごとの制約は不要
         for lesson in self.lessons.values():
             if lesson.units > 1:
-                for unit1 in range(lesson.units):
-                    for unit2 in range(unit1 + 1, lesson.units):
-                        # unit1とunit2が同じtimeslotに配置されることを禁止
-                        for timeslot in self.timeslots:
-                            vars_unit1 = [
-                                var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                                if lid == lesson.id and uid == unit1 and ts == timeslot
-                            ]
-                            vars_unit2 = [
-                                var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                                if lid == lesson.id and uid == unit2 and ts == timeslot
-                            ]
-                            # 両方が選択されることはない（最大1つ）
-                            if vars_unit1 and vars_unit2:
-                                self.model.Add(sum(vars_unit1) + sum(vars_unit2) <= 1)
+                for timeslot in self.timeslots:
+                    lesson_vars = self.by_lesson_ts.get((lesson.id, timeslot), [])
+                    if len(lesson_vars) > 1:
+                        self.model.AddAtMostOne(lesson_vars)
+        
+        # 制約2b: 対称性の除去 - 同一Lessonのunitは入れ替えても同じ時間割になるため、
+        # unitの時間枠の通し番号が昇順になる配置だけを探索する
+        # （同期グループ内で単位数が揃っていない場合はunit同士の対応がずれるため対象外）
+        for lesson in self.lessons.values():
+            if not self._has_ordered_units(lesson) or not self.by_lesson_unit.get((lesson.id, 0)):
+                continue
+            
+            slot_indexes = []
+            for unit_index in range(lesson.units):
+                slot_index = self.model.NewIntVar(0, len(self.timeslots) - 1, f"SlotIndex_{lesson.id}_U{unit_index}")
+                # 選ばれた変数の時間枠の通し番号（unitはちょうど1つに配置される）
+                self.model.Add(slot_index == sum(
+                    timeslot.index * var
+                    for timeslot in self.timeslots
+                    for var in self.by_lesson_unit_ts.get((lesson.id, unit_index, timeslot), [])
+                ))
+                slot_indexes.append(slot_index)
+            
+            for earlier, later in zip(slot_indexes, slot_indexes[1:]):
+                self.model.Add(earlier < later)
         
         # 制約3: 教員競合 - 同一教員は同じtimeslotに1つの授業のみ
-        for teacher_id in self.teachers.keys():
-            for timeslot in self.timeslots:
+        self._add_resource_conflicts(self.by_teacher_ts, self.teachers.keys())
+        
+        # 制約3b: 対称性の除去 - 担当可能な時間と担当候補のLessonが全く同じ教員は、
+        # 時間割全体で入れ替えても同じ時間割になるため、ID順で前の教員から使う
+        # （前の教員が一度も授業を持たないのに後ろの教員が授業を持つことはない）
+        teacher_lessons: Dict[str, List[str]] = defaultdict(list)
+        for lesson in self.lessons.values():
+            for teacher_id in dict.fromkeys(lesson.teacher_ids):
+                teacher_lessons[teacher_id].append(lesson.id)
+        
+        equivalent_teachers: Dict[Tuple[int, Tuple[str, ...]], List[str]] = defaultdict(list)
+        for teacher_id in sorted(teacher_lessons):
+            teacher = self.teachers[teacher_id]
+            key = (teacher.availability_mask, tuple(sorted(teacher_lessons[teacher_id])))
+            equivalent_teachers[key].append(teacher_id)
+        
+        for teacher_ids in equivalent_teachers.values():
+            if len(teacher_ids) < 2:
+                continue
+            used_vars = []
+            for teacher_id in teacher_ids:
                 teacher_vars = [
-                    var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                    if tid == teacher_id and ts == timeslot
+                    var
+                    for timeslot in self.timeslots
+                    for var in self.by_teacher_ts.get((teacher_id, timeslot), [])
                 ]
+                used = self.model.NewBoolVar(f"TeacherUsed_{teacher_id}")
                 if teacher_vars:
-                    self.model.Add(sum(teacher_vars) <= 1)
+                    self.model.AddMaxEquality(used, teacher_vars)
+                else:
+                    self.model.Add(used == 0)
+                used_vars.append(used)
+            for earlier, later in zip(used_vars, used_vars[1:]):
+                self.model.AddImplication(later, earlier)
         
         # 制約4: 教室競合 - 同一教室は同じtimeslotに1つの授業のみ
-        for room_id in self.rooms.keys():
+        self._add_resource_conflicts(self.by_room_ts, self.rooms.keys())
+        
+        # 制約4b: 対称性の除去 - 教室タイプと定員が同じ教室は入れ替えても同じ時間割になるため、
+        # 各timeslotではID順で前の教室から使う（前の教室が空いているのに後ろの教室は使わない）
+        equivalent_rooms: Dict[Tuple[RoomType, int], List[str]] = defaultdict(list)
+        for room in sorted(self.rooms.values(), key=lambda r: r.id):
+            equivalent_rooms[(room.room_type, room.capacity)].append(room.id)
+        
+        for room_ids in equivalent_rooms.values():
             for timeslot in self.timeslots:
-                room_vars = [
-                    var for (lid, uid, ts, r_id, tid), var in self.variables.items()
-                    if r_id == room_id and ts == timeslot
-                ]
-                if room_vars:
-                    self.model.Add(sum(room_vars) <= 1)
+                for earlier_id, later_id in zip(room_ids, room_ids[1:]):
+                    earlier_vars = self.by_room_ts.get((earlier_id, timeslot), [])
+                    later_vars = self.by_room_ts.get((later_id, timeslot), [])
+                    if later_vars:
+                        self.model.Add(sum(later_vars) <= sum(earlier_vars))
         
         # 制約5: クラス競合 - 同一クラスは同じtimeslotに1つの授業のみ
-        for class_id in self.classes.keys():
-            for timeslot in self.timeslots:
-                class_vars = [
-                    var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                    if class_id in self.lessons[lid].class_ids and ts == timeslot
-                ]
-                if class_vars:
-                    self.model.Add(sum(class_vars) <= 1)
+        self._add_resource_conflicts(self.by_class_ts, self.classes.keys())
         
         # 制約6: 同期制約 - 同じsynchronization_idを持つLessonは同じtimeslotに配置
         sync_groups: Dict[str, List[Lesson]] = {}
@@ -143,29 +399,26 @@ class TimetableSolver:
                 base_lesson = sync_lessons[0]
                 
                 for unit_index in range(base_lesson.units):
-                    # 基準Lessonの各unitについて
+                    # このunitを持つLesson（基準Lessonより単位数が少ないLessonは対象外）
+                    unit_lessons = [l for l in sync_lessons if unit_index < l.units]
+                    if len(unit_lessons) < 2:
+                        continue
+                    
+                    # 「グループのこのunitがこのtimeslotに配置される」を表す共有変数を1つ作り、
+                    # 各Lessonのtimeslotごとの配置をこの変数に揃える
+                    chosen_vars = []
                     for timeslot in self.timeslots:
-                        # 基準Lessonがこのtimeslotに配置される変数
-                        base_vars = [
-                            var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                            if lid == base_lesson.id and uid == unit_index and ts == timeslot
-                        ]
-                        
-                        if not base_vars:
-                            continue
-                        
-                        # 他の同期Lessonも同じtimeslotに配置されるようにする
-                        for other_lesson in sync_lessons[1:]:
-                            if unit_index < other_lesson.units:
-                                other_vars = [
-                                    var for (lid, uid, ts, room_id, tid), var in self.variables.items()
-                                    if lid == other_lesson.id and uid == unit_index and ts == timeslot
-                                ]
-                                
-                                if other_vars:
-                                    # base_varsが選択されている ⇔ other_varsが選択されている
-                                    # sum(base_vars) == sum(other_vars)
-                                    self.model.Add(sum(base_vars) == sum(other_vars))
+                        chosen = self.model.NewBoolVar(f"Sync_{sync_id}_U{unit_index}_T{timeslot}")
+                        for lesson in unit_lessons:
+                            lesson_vars = self.by_lesson_unit_ts.get((lesson.id, unit_index, timeslot), [])
+                            if lesson_vars:
+                                self.model.Add(sum(lesson_vars) == chosen)
+                            else:
+                                # 配置できないLessonがあれば、グループ全体がこのtimeslotを使えない
+                                self.model.Add(chosen == 0)
+                        chosen_vars.append(chosen)
+                    
+                    self.model.AddExactlyOne(chosen_vars)
 
         # --- 追加制約: 品質の向上 ---
         
@@ -195,39 +448,43 @@ class TimetableSolver:
                 
                 # 対象となるLessonIDのリスト（このクラス・科目のもの）
                 target_lesson_ids = [
-                    l.id for l in self.lessons.values() 
-                    if class_id in l.class_ids and l.subject == subject
+                    lid for lid in self.lessons_by_class[class_id]
+                    if self.lessons[lid].subject == subject
                 ]
                 
-                for weekday in Weekday.all():
+                for weekday in self.weekdays:
                     # その曜日の該当科目の変数を収集
                     subject_vars_on_day = []
-                    for period in range(1, 7):
-                        ts = TimeSlot(weekday, period)
+                    for ts in self.slots_by_day[weekday]:
                         # このtimeslotにある対象Lessonの変数
                         vars_in_slot = [
-                            var for (lid, uid, t, r_id, tid), var in self.variables.items()
-                            if lid in target_lesson_ids and t == ts
+                            var
+                            for lid in target_lesson_ids
+                            for var in self.by_lesson_ts.get((lid, ts), [])
                         ]
                         subject_vars_on_day.extend(vars_in_slot)
                     
                     if subject_vars_on_day:
-                        self.model.Add(sum(subject_vars_on_day) <= daily_limit)
+                        if daily_limit == 1:
+                            self.model.AddAtMostOne(subject_vars_on_day)
+                        else:
+                            # その日のコマ数を上限つきの整数変数に結び付ける
+                            day_count = self.model.NewIntVar(
+                                0, daily_limit, f"DayCount_{class_id}_{subject}_{weekday}"
+                            )
+                            self.model.Add(day_count == sum(subject_vars_on_day))
+                            self.day_counts[(class_id, subject, weekday)] = day_count
 
         # 制約8: クラスの時間割に空きコマ（中抜け）を作らない
         # 朝から詰める、または連続させる
         for class_id in self.classes.keys():
-            for weekday in Weekday.all():
+            for weekday in self.weekdays:
                 # 各時限(1-6)が「埋まっているか」を表すブール変数を作成
                 is_active = []
-                for period in range(1, 7):
-                    ts = TimeSlot(weekday, period)
+                for period, ts in enumerate(self.slots_by_day[weekday], start=1):
                     
                     # このクラスのこの時間の授業変数すべて
-                    vars_in_slot = [
-                        var for (lid, uid, t, r_id, tid), var in self.variables.items()
-                        if t == ts and class_id in self.lessons[lid].class_ids
-                    ]
+                    vars_in_slot = self.by_class_ts.get((class_id, ts), [])
                     
                     slot_active_var = self.model.NewBoolVar(f"Active_{class_id}_{weekday}_{period}")
                     if vars_in_slot:
@@ -248,78 +505,239 @@ class TimetableSolver:
                 # パディング（前後は0）
                 padded_active = [0] + is_active + [0]
                 
+                # 隣り合う時限の変化を数える。定数同士の変化は定数として足し込み、
+                # 片方が定数0なら変化はもう片方の変数そのものなので補助変数を作らない
                 transitions = []
+                constant_transitions = 0
                 for i in range(len(padded_active) - 1):
-                    # i と i+1 が違うなら 1
-                    trans_var = self.model.NewBoolVar(f"Trans_{class_id}_{weekday}_{i}")
-                    # XORではなく不等価性で実装
-                    # (padded_active[i] != padded_active[i+1])
-                    
-                    # NOTE: padded_activeの要素は IntVar(0/1) または int(0)
-                    # 整数0は cp_model では直接扱えない場合があるため、これらを統一的に扱う
-                    
                     left = padded_active[i]
                     right = padded_active[i+1]
                     
-                    # left != right を表現
-                    # trans_var == 1 <-> left + right == 1 (どちらか片方だけ1)
-                    # trans_var == 0 <-> left + right != 1 (0+0=0, 1+1=2)
-                    
-                    # 式: trans_var == (left + right == 1)
-                    # これは線形制約ではない論理式なので AddBoolXor などを使うべきだが、
-                    # left/rightが定数0の場合があるので注意して構築
-                    
                     if isinstance(left, int) and isinstance(right, int):
-                        # 両方定数（ありえないが念のため）
-                        val = 1 if left != right else 0
-                        self.model.Add(trans_var == val)
+                        constant_transitions += 1 if left != right else 0
                     elif isinstance(left, int):
                         # left=0
-                        self.model.Add(trans_var == right)
+                        transitions.append(right)
                     elif isinstance(right, int):
                         # right=0
-                        self.model.Add(trans_var == left)
+                        transitions.append(left)
                     else:
-                        # 両方変数
-                        # AddBoolXor が古いバージョンで使えない場合があるため、Reification（OnlyEnforceIf）で実装
-                        # trans_var == 1 <-> left != right
-                        self.model.Add(left != right).OnlyEnforceIf(trans_var)
-                        # trans_var == 0 <-> left == right
-                        self.model.Add(left == right).OnlyEnforceIf(trans_var.Not())
-                    
-                    transitions.append(trans_var)
+                        # 両方変数: trans_var == (left XOR right)
+                        # left + right + (1 - trans_var) が奇数 ⇔ trans_var == left XOR right
+                        trans_var = self.model.NewBoolVar(f"Trans_{class_id}_{weekday}_{i}")
+                        self.model.AddBoolXOr([left, right, trans_var.Not()])
+                        transitions.append(trans_var)
                 
                 # トランジション回数 <= 2 に制約することで中抜けを禁止
-                self.model.Add(sum(transitions) <= 2)
+                self.model.Add(sum(transitions) <= 2 - constant_transitions)
+    
+    def _add_resource_conflicts(
+        self,
+        index: Dict[Tuple[str, TimeSlot], List[cp_model.IntVar]],
+        resource_ids
+    ):
+        """資源（教員・教室・クラス）ごとに、同じtimeslotの配置を高々1つにする"""
+        for resource_id in resource_ids:
+            if self.use_no_overlap:
+                # 配置を時間軸上の長さ1の区間とみなし、資源ごとに重ならないようにする
+                intervals = [
+                    self._placement_interval(var, timeslot)
+                    for timeslot in self.timeslots
+                    for var in index.get((resource_id, timeslot), [])
+                ]
+                if len(intervals) > 1:
+                    self.model.AddNoOverlap(intervals)
+            else:
+                for timeslot in self.timeslots:
+                    resource_vars = index.get((resource_id, timeslot), [])
+                    if resource_vars:
+                        self.model.AddAtMostOne(resource_vars)
+    
+    def _placement_interval(self, var: cp_model.IntVar, timeslot: TimeSlot) -> cp_model.IntervalVar:
+        """配置変数が選ばれたときだけ存在する、timeslotの通し番号から始まる長さ1の区間"""
+        interval = self.intervals.get(var.Index())
+        if interval is None:
+            interval = self.model.NewOptionalFixedSizeIntervalVar(timeslot.index, 1, var, "")
+            self.intervals[var.Index()] = interval
+        return interval
+    
+    def greedy_seed(self) -> Dict[int, int]:
+        """
+        貪欲法で作った配置をソルバーのヒント用に返す
+        
+        単位数×対象クラス数の多いLessonから順に、教員・教室・クラスが空いている
+        最初の時間枠に置いていく。時間枠は時限ごとに曜日を回る順で試し、授業が
+        各曜日の前の時限から埋まるようにする。同期・1日の科目数・空きコマの制約は
+        考慮しない（ソルバー側でヒントを修正する）。
+        
+        Returns:
+            選んだ配置の変数キー -> 1 の辞書（置けなかったunitは含まない）
+        """
+        teacher_busy = set()
+        room_busy = set()
+        class_busy = set()
+        seed: Dict[int, int] = {}
+        
+        rooms = sorted(self.rooms.values(), key=lambda r: r.id)
+        slot_order = sorted(self.timeslots, key=lambda ts: (ts.period, ts.weekday))
+        lessons = sorted(
+            self.lessons.values(),
+            key=lambda l: l.units * len(l.class_ids),
+            reverse=True
+        )
+        
+        for lesson in lessons:
+            placed = []
+            for timeslot in slot_order:
+                if len(placed) == lesson.units:
+                    break
+                if any((class_id, timeslot) in class_busy for class_id in lesson.class_ids):
+                    continue
+                # unitは時間枠の昇順に割り当てる（unitの対称性除去と揃える）。
+                # この時間枠が入る位置のunitになり、後ろの配置はunitが1つずつ後ろにずれる
+                unit_index = sum(1 for p in placed if p[0].index < timeslot.index)
+                if any(
+                    self._pack_key(lesson.id, shifted_index + 1, *p) not in self.variables
+                    for shifted_index, p in enumerate(placed[unit_index:], start=unit_index)
+                ):
+                    continue
+                choice = next(
+                    (
+                        (room.id, teacher_id)
+                        for room in rooms
+                        if (room.id, timeslot) not in room_busy
+                        for teacher_id in lesson.teacher_ids
+                        if (teacher_id, timeslot) not in teacher_busy
+                        and self._pack_key(lesson.id, unit_index, timeslot, room.id, teacher_id) in self.variables
+                    ),
+                    None
+                )
+                if choice is None:
+                    continue
+                room_id, teacher_id = choice
+                room_busy.add((room_id, timeslot))
+                teacher_busy.add((teacher_id, timeslot))
+                for class_id in lesson.class_ids:
+                    class_busy.add((class_id, timeslot))
+                placed.insert(unit_index, (timeslot, room_id, teacher_id))
+            
+            # placedは時間枠の昇順で、並び順がそのままunitの番号になる
+            for unit_index, (timeslot, room_id, teacher_id) in enumerate(placed):
+                seed[self._pack_key(lesson.id, unit_index, timeslot, room_id, teacher_id)] = 1
+        
+        return seed
+    
+    def backtrack_seed(self, max_attempts: int = 2000) -> Dict[int, int]:
+        """
+        バックトラックソルバーで作った配置をソルバーのヒント用に返す
+        
+        解が見つからなければ最も多く配置できた途中の時間割を使い、
+        1コマも置けなければ greedy_seed の配置にする。バックトラックは
+        1日の科目数・空きコマの制約を考慮しない（ソルバー側でヒントを修正する）。
+        
+        Args:
+            max_attempts: バックトラックの最大試行回数
+        
+        Returns:
+            選んだ配置の変数キー -> 1 の辞書
+        """
+        backtrack = BacktrackSolver(
+            list(self.teachers.values()),
+            list(self.rooms.values()),
+            list(self.classes.values()),
+            list(self.lessons.values())
+        )
+        timetable = backtrack.solve(max_attempts=max_attempts, verbose=False) or backtrack.best_partial
+        if timetable is None or len(timetable) == 0:
+            return self.greedy_seed()
+        
+        seed: Dict[int, int] = {}
+        for lesson_id in self.lessons:
+            # unitは時間枠の昇順に割り当てる（unitの対称性除去と揃える）
+            placed = sorted(timetable.get_assignments_by_lesson(lesson_id), key=lambda a: a.timeslot.index)
+            for unit_index, assignment in enumerate(placed):
+                key = self._pack_key(lesson_id, unit_index, assignment.timeslot, assignment.room.id, assignment.teacher_id)
+                if key in self.variables:
+                    seed[key] = 1
+        return seed
     
-    def solve(self, timeout_seconds: int = 60) -> Optional[Timetable]:
+    def build(self) -> 'TimetableSolver':
+        """
+        変数とハード制約をモデルに追加する（2回目以降は何もしない）
+        
+        solve() を繰り返し呼ぶ場合も、モデルは最初の1回だけ作られる。
+        
+        Returns:
+            self
+        """
+        if not self._built:
+            self.setup_variables()
+            self.add_hard_constraints()
+            self._built = True
+        return self
+    
+    def solve(
+        self,
+        timeout_seconds: int = 60,
+        log_search_progress: bool = False,
+        workers: Optional[int] = None,
+        random_seed: Optional[int] = None,
+        backtrack_hint: bool = False,
+        stop_after_first_solution: bool = False
+    ) -> Optional[Timetable]:
         """
         時間割を生成
         
         Args:
             timeout_seconds: タイムアウト時間（秒）
+            log_search_progress: Trueならソルバーの探索ログを標準出力に出す
+            workers: 並列探索のワーカー数（Noneなら CPU数。探索戦略の並列実行を保つため最低2、最大16）
+            random_seed: ソルバーの乱数シード（Noneならソルバーの既定値）
+            backtrack_hint: Trueならヒントに貪欲法ではなくバックトラックソルバーの配置を使う
+            stop_after_first_solution: Trueなら最初に見つかった解で探索を打ち切る
         
         Returns:
-            生成された時間割（解が見つからない場合はNone）
+            生成された時間割（解が見つからない場合はNone）。
+            stop_search() などで探索が打ち切られても、それまでに見つかった解があれば返す
+        
+        同じインスタンスで再度呼ぶと、作成済みのモデルを再利用する
+        （random_seed を変えれば別の解を探せる）。
         """
-        # 変数と制約のセットアップ
-        self.setup_variables()
-        self.add_hard_constraints()
+        # 変数と制約のセットアップ（作成済みなら再利用）
+        self.build()
+        
+        # 貪欲法（またはバックトラック）の配置をヒントとして与える（制約に反する部分はソルバーが修正する）
+        # 前回の呼び出しで与えたヒントは消してから与え直す
+        self.model.ClearHints()
+        seed = self.backtrack_seed() if backtrack_hint else self.greedy_seed()
+        for key, var in self.variables.items():
+            self.model.AddHint(var, seed.get(key, 0))
         
         # ソルバーの実行
         solver = cp_model.CpSolver()
         solver.parameters.max_time_in_seconds = timeout_seconds
-        solver.parameters.num_search_workers = 16  # 並列処理
-        solver.parameters.log_search_progress = True
+        solver.parameters.num_search_workers = workers or max(2, min(16, os.cpu_count() or 1))  # 並列処理
+        if random_seed is not None:
+            solver.parameters.random_seed = random_seed
+        solver.parameters.log_search_progress = log_search_progress
+        solver.parameters.stop_after_first_solution = stop_after_first_solution
         
-        status = solver.Solve(self.model)
+        self._monitor = _SearchMonitor()
+        try:
+            status = solver.Solve(self.model, self._monitor)
+        finally:
+            self._monitor = None
         
+        # 打ち切られた探索でも、解が見つかっていれば状態はFEASIBLEになる
         if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
             # 解から時間割を構築
             timetable = Timetable()
+            # 全変数の値を一度に取り出す（変数の添字で引ける）
+            values = solver.ResponseProto().solution
             
-            for (lesson_id, unit_index, timeslot, room_id, teacher_id), var in self.variables.items():
-                if solver.Value(var) == 1:
+            for key, var in self.variables.items():
+                if values[var.Index()]:
+                    lesson_id, unit_index, timeslot, room_id, teacher_id = self._unpack_key(key)
                     lesson = self.lessons[lesson_id]
                     room = self.rooms[room_id]
                     assignment = Assignment(
@@ -331,11 +749,7 @@ class TimetableSolver:
                     timetable.add_assignment(assignment)
             
             # 念のため制約チェック
-            is_valid, errors = is_valid_assignment(
-                timetable,
-                self.teachers,
-                list(self.lessons.values())
-            )
+            is_valid, errors = self._validate(timetable)
             
             if not is_valid:
                 print("警告: 生成された時間割に制約違反があります:")
@@ -352,11 +766,22 @@ class TimetableSolver:
             print(f"ソルバーのステータス: {status}")
             return None
     
+    def stop_search(self):
+        """
+        実行中の solve() の探索を打ち切る（別スレッドから呼ぶ）
+        
+        それまでに解が見つかっていれば、solve() はその解の時間割を返す。
+        """
+        monitor = self._monitor
+        if monitor is not None:
+            monitor.StopSearch()
+    
     def get_solver_info(self, solver: cp_model.CpSolver) -> str:
         """ソルバーの実行情報を取得"""
         return f"""
 ソルバー情報:
   - 決定変数数: {len(self.variables)}
+  - 事前に除外した配置: {self.pruned_variable_count}
   - 実行時間: {solver.WallTime():.2f}秒
   - 分岐数: {solver.NumBranches()}
   - 競合数: {solver.NumConflicts()}
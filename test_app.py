@@ -0,0 +1,67 @@
+"""
+Webアプリのテスト - Excel出力
+
+同名の教員・クラスがいてもExcelファイルを書き出せるかを検証
+（streamlitが無い環境ではスキップ）
+"""
+import io
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import openpyxl
+
+import app
+from models import Teacher, Room, Class, Lesson, TimeSlot, Assignment, Timetable, RoomType
+
+
+def _export_sheet_names() -> list:
+    teachers = {
+        "T1": Teacher.create_with_full_availability("T1", "田中先生"),
+        "T2": Teacher.create_with_full_availability("T2", "田中先生"),
+    }
+    classes = [Class("1A", "1-A", 40), Class("1B", "1-A", 40)]
+    room = Room("R1", "普通教室1", RoomType.GENERAL, 40)
+    lesson = Lesson("L1", "数学", 1, ("T1", "T2"), ("1A", "1B"), RoomType.GENERAL)
+    timetable = Timetable([Assignment(lesson, TimeSlot.all_slots()[0], room, "T2")])
+
+    app.export_to_excel.clear()
+    data = app.export_to_excel(timetable, classes, teachers)
+    return openpyxl.load_workbook(io.BytesIO(data)).sheetnames
+
+
+@pytest.mark.parametrize("xlsxwriter_available", [True, False])
+def test_export_same_named_teachers(monkeypatch, xlsxwriter_available):
+    """同名の教員・クラスは別々のシートに書き出す"""
+    if xlsxwriter_available and not app.XLSXWRITER_AVAILABLE:
+        pytest.skip("xlsxwriter がインストールされていません")
+    monkeypatch.setattr(app, "XLSXWRITER_AVAILABLE", xlsxwriter_available)
+
+    sheet_names = _export_sheet_names()
+
+    assert sheet_names == ["全体", "クラス_1-A", "クラス_1-A_2", "教員_田中先生", "教員_田中先生_2"]
+
+
+def test_unique_sheet_name_limits_length():
+    """31文字を超える名前は切り詰め、大文字小文字だけの違いも重複とみなす"""
+    used = set()
+    long_name = "教員_" + "あ" * 40
+    assert app._unique_sheet_name(long_name, used) == long_name[:31]
+    assert app._unique_sheet_name(long_name, used) == long_name[:29] + "_2"
+    assert app._unique_sheet_name("Sheet", used) == "Sheet"
+    assert app._unique_sheet_name("SHEET", used) == "SHEET_2"
+
+
+def test_cache_key_reflects_rendered_content():
+    """IDが同じでも科目名・教室名が変われば別のキャッシュキーになる"""
+    timeslot = TimeSlot.all_slots()[0]
+    room = Room("R1", "普通教室1", RoomType.GENERAL, 40)
+    lesson = Lesson("L1", "数学", 1, ("T1",), ("1A",), RoomType.GENERAL)
+    renamed_room = Room("R1", "普通教室A", RoomType.GENERAL, 40)
+    renamed_lesson = Lesson("L1", "数学I", 1, ("T1",), ("1A",), RoomType.GENERAL)
+
+    key = app._timetable_cache_key(Timetable([Assignment(lesson, timeslot, room, "T1")]))
+    assert key == app._timetable_cache_key(Timetable([Assignment(lesson, timeslot, room, "T1")]))
+    assert key != app._timetable_cache_key(Timetable([Assignment(renamed_lesson, timeslot, room, "T1")]))
+    assert key != app._timetable_cache_key(Timetable([Assignment(lesson, timeslot, renamed_room, "T1")]))
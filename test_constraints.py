@@ -0,0 +1,165 @@
+"""
+制約チェックのテスト - 高速モードと参照実装の一致
+
+ランダムな時間割に対して、fast_check / fast_mode / stop_on_first_failure /
+check_incremental の結果が、全件を調べる通常のチェックと一致するかを検証
+"""
+import random
+from typing import Dict, Tuple
+
+from models import (
+    Teacher, Room, Lesson, TimeSlot, Assignment, Timetable, RoomType
+)
+from constraints import (
+    check_all_conflicts, check_synchronization, check_room_type,
+    check_teacher_availability, check_lesson_units, check_incremental,
+    compile_validator, is_valid_assignment
+)
+
+
+# 違反が起きやすいよう、配置先は先頭の数コマに絞る
+SLOTS = TimeSlot.all_slots()[:4]
+
+ROOMS = [
+    Room("R0", "普通教室A", RoomType.GENERAL, 40),
+    Room("R1", "普通教室B", RoomType.GENERAL, 40),
+    Room("R2", "理科室", RoomType.SCIENCE, 40),
+]
+
+LESSONS = [
+    Lesson("L0", "数学", 2, ["T0", "T1"], ["1A"], RoomType.GENERAL),
+    Lesson("L1", "理科", 1, ["T1"], ["1A", "1B"], RoomType.SCIENCE, synchronization_id="S"),
+    Lesson("L2", "英語", 1, ["T2", "T3"], ["1D"], RoomType.GENERAL, synchronization_id="S"),
+    Lesson("L3", "国語", 1, ["T0"], ["1C"], RoomType.GENERAL),
+]
+
+
+def _random_teachers(rnd: random.Random) -> Dict[str, Teacher]:
+    """一部の時間枠が担当不可の教員"""
+    teachers = [Teacher.create_with_full_availability(f"T{i}", f"教員{i}") for i in range(4)]
+    for timeslot in SLOTS:
+        if rnd.random() < 0.3:
+            rnd.choice(teachers).set_availability(timeslot, False)
+    return {t.id: t for t in teachers}
+
+
+def _random_assignment(rnd: random.Random) -> Assignment:
+    """教室タイプや担当教員の違反も含みうるランダムな配置"""
+    lesson = rnd.choice(LESSONS)
+    return Assignment(
+        lesson=lesson,
+        timeslot=rnd.choice(SLOTS),
+        room=rnd.choice(ROOMS),
+        teacher_id=rnd.choice(lesson.teacher_ids)
+    )
+
+
+def _complete_timetable(rnd: random.Random) -> Timetable:
+    """各Lessonを単位数ぶん配置した時間割（同期グループは同じ時間枠に置き、全制約を満たすこともある）"""
+    sync_slots: Dict[str, TimeSlot] = {}
+    assignments = []
+    for lesson in LESSONS:
+        for _ in range(lesson.units):
+            if lesson.synchronization_id:
+                timeslot = sync_slots.setdefault(lesson.synchronization_id, rnd.choice(SLOTS))
+            else:
+                timeslot = rnd.choice(SLOTS)
+            eligible_rooms = [r for r in ROOMS if r.room_type == lesson.room_type_required]
+            room = rnd.choice(eligible_rooms if rnd.random() < 0.9 else ROOMS)
+            assignments.append(Assignment(lesson, timeslot, room, rnd.choice(lesson.teacher_ids)))
+    return Timetable(assignments)
+
+
+def _random_case(seed: int) -> Tuple[Timetable, Dict[str, Teacher]]:
+    rnd = random.Random(seed)
+    teachers = _random_teachers(rnd)
+    if seed % 2:
+        timetable = _complete_timetable(rnd)
+    else:
+        timetable = Timetable([_random_assignment(rnd) for _ in range(rnd.randint(0, 6))])
+    return timetable, teachers
+
+
+def test_fast_check_matches_full_checks():
+    """fast_check はメッセージを作らず、通常のチェックと同じ判定を返す"""
+    for seed in range(500):
+        timetable, teachers = _random_case(seed)
+        pairs = [
+            (check_all_conflicts(timetable), check_all_conflicts(timetable, fast_check=True)),
+            (check_synchronization(timetable, LESSONS), check_synchronization(timetable, LESSONS, True)),
+            (check_room_type(timetable), check_room_type(timetable, True)),
+            (check_teacher_availability(timetable, teachers), check_teacher_availability(timetable, teachers, True)),
+            (check_lesson_units(timetable, LESSONS), check_lesson_units(timetable, LESSONS, True)),
+            (
+                is_valid_assignment(timetable, teachers, LESSONS),
+                is_valid_assignment(timetable, teachers, LESSONS, fast_check=True)
+            ),
+        ]
+        for (full_valid, full_errors), (fast_valid, fast_errors) in pairs:
+            assert fast_valid == full_valid, (seed, full_errors)
+            assert fast_errors == []
+            assert full_valid == (not full_errors)
+
+
+def test_fast_mode_matches_full_conflict_check():
+    """fast_mode は競合の有無が同じで、違反時はメッセージを1件だけ返す"""
+    for seed in range(500):
+        timetable, _ = _random_case(seed)
+        full_valid, full_errors = check_all_conflicts(timetable)
+        fast_valid, fast_errors = check_all_conflicts(timetable, fast_mode=True)
+        assert fast_valid == full_valid, (seed, full_errors)
+        assert len(fast_errors) == (0 if full_valid else 1)
+
+
+def test_stop_on_first_failure_matches_full_validation():
+    """stop_on_first_failure は判定が同じで、メッセージは全件の先頭部分になる"""
+    for seed in range(500):
+        timetable, teachers = _random_case(seed)
+        full_valid, full_errors = is_valid_assignment(timetable, teachers, LESSONS)
+        stop_valid, stop_errors = is_valid_assignment(
+            timetable, teachers, LESSONS, stop_on_first_failure=True
+        )
+        assert stop_valid == full_valid, (seed, full_errors)
+        assert stop_errors == full_errors[:len(stop_errors)]
+        assert full_valid or stop_errors
+
+
+def test_compiled_validator_matches_is_valid_assignment():
+    """compile_validator で作った関数は同じ入力データで使い回しても結果が変わらない"""
+    rnd = random.Random(0)
+    teachers = _random_teachers(rnd)
+    validate = compile_validator(teachers, LESSONS)
+    for seed in range(500):
+        timetable = _complete_timetable(rnd)
+        assert validate(timetable) == is_valid_assignment(timetable, teachers, LESSONS), seed
+
+
+def test_check_incremental_matches_full_recheck():
+    """差分チェックは、配置を追加した時間割の全件チェックと一致する"""
+    for seed in range(500):
+        rnd = random.Random(seed)
+        teachers = _random_teachers(rnd)
+        # 差分チェックの前提どおり、制約を満たす配置だけを積み上げる
+        timetable = Timetable()
+        for _ in range(rnd.randint(0, 5)):
+            assignment = _random_assignment(rnd)
+            if check_incremental(timetable, assignment, teachers):
+                timetable.add_assignment(assignment)
+
+        assignment = _random_assignment(rnd)
+        extended = Timetable(list(timetable.assignments) + [assignment])
+        expected = (
+            check_all_conflicts(extended)[0]
+            and check_room_type(extended)[0]
+            and check_teacher_availability(extended, teachers)[0]
+        )
+        assert check_incremental(timetable, assignment, teachers) == expected, seed
+
+
+if __name__ == "__main__":
+    test_fast_check_matches_full_checks()
+    test_fast_mode_matches_full_conflict_check()
+    test_stop_on_first_failure_matches_full_validation()
+    test_compiled_validator_matches_is_valid_assignment()
+    test_check_incremental_matches_full_recheck()
+    print("✓ 高速モードと参照実装の一致: OK")
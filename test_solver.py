@@ -0,0 +1,65 @@
+"""
+OR-Toolsソルバーのテスト
+
+サンプルデータで時間割が生成でき、全ハード制約を満たすかを検証
+"""
+from example import create_sample_data
+from solver import TimetableSolver
+from backtrack_solver import BacktrackSolver
+from constraints import is_valid_assignment
+
+
+def test_no_overlap_encoding():
+    """教員・教室・クラス競合をNoOverlapで表したモデルでもサンプルデータが解ける"""
+    teachers, rooms, classes, lessons = create_sample_data()
+    solver = TimetableSolver(teachers, rooms, classes, lessons, use_no_overlap=True)
+
+    timetable = solver.solve(timeout_seconds=60, random_seed=0)
+
+    assert timetable is not None, "制限時間内に解が見つかりませんでした"
+    is_valid, errors = is_valid_assignment(timetable, {t.id: t for t in teachers}, list(lessons))
+    assert is_valid, errors
+    assert len(timetable) == sum(l.units for l in lessons)
+
+
+def test_pack_key_round_trip():
+    """整数キーは _unpack_key で元の配置に戻り、再度詰めると同じキーになる"""
+    teachers, rooms, classes, lessons = create_sample_data()
+    solver = TimetableSolver(teachers, rooms, classes, lessons)
+    solver.build()
+
+    assert solver.variables
+    for key in solver.variables:
+        assert solver._pack_key(*solver._unpack_key(key)) == key
+
+    lesson = lessons[0]
+    placement = (lesson.id, lesson.units - 1, solver.timeslots[-1], rooms[-1].id, lesson.teacher_ids[0])
+    assert solver._unpack_key(solver._pack_key(*placement)) == placement
+
+
+def test_backtrack_restart_is_deterministic():
+    """再始動を挟んでも、同じシードなら同じ時間割になる"""
+    teachers, rooms, classes, lessons = create_sample_data()
+
+    results = []
+    for _ in range(2):
+        backtrack = BacktrackSolver(teachers, rooms, classes, lessons)
+        backtrack.RESTART_BASE_ATTEMPTS = 5
+        timetable = backtrack.solve(max_attempts=20000, seed=3, verbose=False)
+
+        assert timetable is not None
+        assert backtrack.restart_count > 0
+        is_valid, errors = is_valid_assignment(timetable, {t.id: t for t in teachers}, list(lessons))
+        assert is_valid, errors
+        results.append(sorted(
+            (a.lesson.id, a.timeslot.index, a.room.id, a.teacher_id) for a in timetable.assignments
+        ))
+
+    assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    test_no_overlap_encoding()
+    test_pack_key_round_trip()
+    test_backtrack_restart_is_deterministic()
+    print("✓ NoOverlapモデルでの時間割生成: OK")
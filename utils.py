@@ -3,11 +3,18 @@
 
 時間割の表示、出力、入力データ検証など
 """
-from typing import List, Dict, Optional
+from collections import Counter
+from typing import List, Optional
 import csv
 from models import Timetable, TimeSlot, Weekday, Teacher, Room, Class, Lesson
 from constraints import validate_input_data
 
+# CSV書き込みのバッファサイズ（配置数が多い時間割でも書き込み回数を抑える）
+CSV_BUFFER_SIZE = 1 << 20
+
+# 曜日の略称（Weekday.valueの順）
+_WEEKDAY_SHORT_NAMES = ("月", "火", "水", "木", "金")
+
 
 def print_timetable(timetable: Timetable, class_id: Optional[str] = None):
     """
@@ -17,19 +24,14 @@ def print_timetable(timetable: Timetable, class_id: Optional[str] = None):
         timetable: 表示する時間割
         class_id: 特定のクラスIDを指定すると、そのクラスの時間割のみ表示
     """
-    from typing import Optional
-    
-    # 時間枠ごとにグループ化
-    slots_dict: Dict[TimeSlot, List] = {}
-    for timeslot in TimeSlot.all_slots():
-        slots_dict[timeslot] = []
-    
+    # 時間枠ごとにグループ化（TimeSlot.indexの位置に格納）
+    slots_list: List[List] = [[] for _ in TimeSlot.all_slots()]
     for assignment in timetable.assignments:
         # クラスフィルタ
         if class_id and class_id not in assignment.lesson.class_ids:
             continue
         
-        slots_dict[assignment.timeslot].append(assignment)
+        slots_list[assignment.timeslot.index].append(assignment)
     
     # ヘッダー
     print("\n" + "=" * 100)
@@ -53,8 +55,7 @@ def print_timetable(timetable: Timetable, class_id: Optional[str] = None):
         print("-" * 100)
         
         for period in range(1, 7):
-            timeslot = TimeSlot(weekday=weekday, period=period)
-            assignments = slots_dict[timeslot]
+            assignments = slots_list[TimeSlot.get(weekday, period).index]
             
             if assignments:
                 print(f"{period}時限目:")
@@ -82,12 +83,10 @@ def print_teacher_schedule(timetable: Timetable, teacher_id: str, teacher_name:
     
     assignments = timetable.get_assignments_by_teacher(teacher_id)
     
-    # 曜日・時限でグループ化
-    schedule: Dict[TimeSlot, List] = {}
+    # 曜日・時限でグループ化（TimeSlot.indexの位置に格納）
+    schedule: List[List] = [[] for _ in TimeSlot.all_slots()]
     for assignment in assignments:
-        if assignment.timeslot not in schedule:
-            schedule[assignment.timeslot] = []
-        schedule[assignment.timeslot].append(assignment)
+        schedule[assignment.timeslot.index].append(assignment)
     
     # 曜日ごとに表示
     weekday_names = {
@@ -101,9 +100,9 @@ def print_teacher_schedule(timetable: Timetable, teacher_id: str, teacher_name:
     for weekday in Weekday.all():
         print(f"\n{weekday_names[weekday]}曜日:")
         for period in range(1, 7):
-            timeslot = TimeSlot(weekday=weekday, period=period)
-            if timeslot in schedule:
-                for assignment in schedule[timeslot]:
+            slot_assignments = schedule[TimeSlot.get(weekday, period).index]
+            if slot_assignments:
+                for assignment in slot_assignments:
                     class_names = ", ".join(assignment.lesson.class_ids)
                     print(f"  {period}限: {assignment.lesson.subject} ({class_names}) @ {assignment.room.name}")
             else:
@@ -120,7 +119,7 @@ def export_to_csv(timetable: Timetable, filename: str):
         timetable: 出力する時間割
         filename: 出力ファイル名
     """
-    with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+    with open(filename, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as csvfile:
         writer = csv.writer(csvfile)
         
         # ヘッダー
@@ -128,28 +127,22 @@ def export_to_csv(timetable: Timetable, filename: str):
             '曜日', '時限', '科目', 'クラス', '教室', '教員ID', '同期ID'
         ])
         
-        # データ
-        weekday_names = {
-            Weekday.MONDAY: "月",
-            Weekday.TUESDAY: "火",
-            Weekday.WEDNESDAY: "水",
-            Weekday.THURSDAY: "木",
-            Weekday.FRIDAY: "金"
-        }
-        
-        for assignment in sorted(
-            timetable.assignments,
-            key=lambda a: (a.timeslot.weekday.value, a.timeslot.period)
-        ):
-            writer.writerow([
-                weekday_names[assignment.timeslot.weekday],
+        # データ（行はジェネレータで1行ずつ作る）
+        writer.writerows(
+            (
+                _WEEKDAY_SHORT_NAMES[assignment.timeslot.weekday.value],
                 assignment.timeslot.period,
                 assignment.lesson.subject,
                 ", ".join(assignment.lesson.class_ids),
                 assignment.room.name,
                 assignment.teacher_id,
                 assignment.lesson.synchronization_id or ""
-            ])
+            )
+            for assignment in sorted(
+                timetable.assignments,
+                key=lambda a: a.timeslot.index
+            )
+        )
     
     print(f"時間割を {filename} に出力しました")
 
@@ -167,32 +160,26 @@ def print_statistics(timetable: Timetable):
     # 総授業数
     print(f"総配置数: {len(timetable.assignments)} コマ")
     
-    # 教員ごとの授業数
-    teacher_counts: Dict[str, int] = {}
+    # 教員ごと・教室ごと・時間枠ごとの数を1回の走査で集計
+    teacher_counts: Counter = Counter()
+    room_counts: Counter = Counter()
+    timeslot_counts = [0] * len(TimeSlot.all_slots())
     for assignment in timetable.assignments:
-        teacher_id = assignment.teacher_id
-        teacher_counts[teacher_id] = teacher_counts.get(teacher_id, 0) + 1
+        teacher_counts[assignment.teacher_id] += 1
+        room_counts[assignment.room.name] += 1
+        timeslot_counts[assignment.timeslot.index] += 1
     
+    # 教員ごとの授業数
     print("\n教員別授業数:")
-    for teacher_id, count in sorted(teacher_counts.items(), key=lambda x: x[1], reverse=True):
+    for teacher_id, count in teacher_counts.most_common():
         print(f"  {teacher_id}: {count}コマ")
     
     # 教室ごとの使用数
-    room_counts: Dict[str, int] = {}
-    for assignment in timetable.assignments:
-        room_name = assignment.room.name
-        room_counts[room_name] = room_counts.get(room_name, 0) + 1
-    
     print("\n教室別使用数:")
-    for room_name, count in sorted(room_counts.items(), key=lambda x: x[1], reverse=True):
+    for room_name, count in room_counts.most_common():
         print(f"  {room_name}: {count}コマ")
     
     # 時間枠ごとの使用率
-    timeslot_counts: Dict[TimeSlot, int] = {}
-    for assignment in timetable.assignments:
-        timeslot = assignment.timeslot
-        timeslot_counts[timeslot] = timeslot_counts.get(timeslot, 0) + 1
-    
     print("\n時間枠別配置数（混雑状況）:")
     weekday_names = {
         Weekday.MONDAY: "月",
@@ -205,8 +192,7 @@ def print_statistics(timetable: Timetable):
     for weekday in Weekday.all():
         print(f"\n  {weekday_names[weekday]}曜日:")
         for period in range(1, 7):
-            timeslot = TimeSlot(weekday=weekday, period=period)
-            count = timeslot_counts.get(timeslot, 0)
+            count = timeslot_counts[TimeSlot.get(weekday, period).index]
             bar = "■" * count
             print(f"    {period}限: {bar} ({count})")
     